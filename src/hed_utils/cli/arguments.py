@@ -57,7 +57,7 @@ def output_file_path(arg: str) -> Path:
 def input_file_path(arg: str) -> Path:
     """Process and convert string to readable file-path."""
 
-    path = input_file_path(arg)
+    path = output_file_path(arg)
     if not path.exists():
         raise ArgumentTypeError(FileNotFoundError)
     return path
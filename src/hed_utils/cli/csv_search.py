@@ -1,18 +1,65 @@
 """usage: csv-search [-h]
                         [-v] [-vv] [--log-format LOG_FORMAT]
-                        [-d DIRECTORY] [-o TEXT_REPORT] [-xl EXCEL_REPORT]
-                        [-e ENCODING] -t TEXT [-i]
+                        [-d DIRECTORY] [--max-depth MAX_DEPTH] [--exclude-dirs DIR [DIR ...]]
+                        [--scan-workers SCAN_WORKERS] [-o TEXT_REPORT] [-xl EXCEL_REPORT]
+                        [--excel-workbook-rows EXCEL_WORKBOOK_ROWS] [--report REPORT_FILE]
+                        [-e ENCODING] [-t TEXT] [--terms-file TERMS_FILE] [-i]
+                        [-r] [--columns COLUMN [COLUMN ...]] [--count-only] [--limit LIMIT]
+                        [--stream] [--max-rows-in-flight MAX_ROWS_IN_FLIGHT]
+                        [--chunk-size CHUNK_SIZE] [--mmap] [--index INDEX_FILE]
+                        [--cache [CACHE_DIR]] [--cache-size CACHE_SIZE]
 
 Find text in CSV files.
 
 optional arguments:
   -h, --help            show this help message and exit
   -d DIRECTORY          path to CSV files directory (default: CWD)
+  --max-depth MAX_DEPTH
+                        how deep to look for CSV files in the sub-directories, 0 for the directory only
+                        (default: no limit)
+  --exclude-dirs DIR [DIR ...]
+                        names (or glob patterns) of sub-directories to skip (default: none)
+  --scan-workers SCAN_WORKERS
+                        list the sub-directories in parallel with this many threads, for network drives
+                        (default: sequential)
   -o TEXT_REPORT        filepath for writing text report
   -xl EXCEL_REPORT      filepath for writing excel report
-  -e ENCODING           encoding for opening the CSV files (default: utf-8)
-  -t TEXT               the text to find
+  --excel-workbook-rows EXCEL_WORKBOOK_ROWS
+                        write the excel report as multiple workbooks with up to this many rows each, generated in
+                        parallel, with JSON manifest listing their sheets (ignored with --stream and --count-only)
+                        (default: single workbook)
+  --report REPORT_FILE  filepath for writing machine-readable report, the format is chosen by the extension:
+                        .csv, .jsonl, .parquet or .feather (Parquet and Feather require pyarrow), or .xlsx
+                        (can be repeated)
+  -e ENCODING           encoding for opening the CSV files, 'auto' detects the encoding and the CSV dialect
+                        of each file (default: utf-8)
+  -t TEXT               the text to find (can be repeated to find any of multiple terms in a single pass)
+  --terms-file TERMS_FILE
+                        path to UTF-8 text file with terms to find, one per line
   -i                    if passed search will ignore casing (default: False)
+  -r, --regex           treat the texts as regular expressions (default: False)
+  --columns COLUMN [COLUMN ...]
+                        search only in the columns with these header names (default: all columns)
+  --count-only          only count the matching rows in each file, without keeping them (default: False)
+  --limit LIMIT         stop the search once this many matching rows were found (default: no limit)
+  --stream              write the reports while searching, keeping bounded memory (default: False)
+  --max-rows-in-flight MAX_ROWS_IN_FLIGHT
+                        max matching rows buffered between the workers and the reports in --stream mode
+                        (default: 10000)
+  --chunk-size CHUNK_SIZE
+                        split CSV files bigger than this many MiB into chunks that are searched in parallel
+                        (default: 64, 0 disables the splitting)
+  --mmap                search the raw bytes of memory-mapped files, decoding only the matching records
+                        (default: False)
+  --index INDEX_FILE    path to SQLite index of the CSV files (created if missing), that is updated for the changed
+                        files and then used to answer the search without re-scanning all files
+                        (--stream and --mmap are ignored)
+  --cache [CACHE_DIR]   reuse the results for the files that were not changed since their last search,
+                        stored in CACHE_DIR (default: the user cache dir), can't be combined with --count-only,
+                        --stream, --limit and --index
+  --cache-size CACHE_SIZE
+                        max size of the results cache in MiB, the least recently used entries are evicted
+                        (default: 512)
 
   logging related
 
@@ -29,12 +76,23 @@ from os.path import abspath, basename
 from pathlib import Path
 
 from hed_utils.cli.arguments import create_parser
+from hed_utils.cli.arguments import input_file_path
 from hed_utils.cli.arguments import input_folder_path
+from hed_utils.cli.arguments import int_value
 from hed_utils.cli.arguments import output_file_path
+from hed_utils.cli.arguments import output_folder_path
 from hed_utils.cli.arguments import string_value
-from hed_utils.support.file_utils.csv_file import get_csv_files
+from hed_utils.support.file_utils.csv_cache import DEFAULT_CACHE_FOLDER, CsvResultCache
+from hed_utils.support.file_utils.csv_index import CsvIndex
+from hed_utils.support.file_utils.csv_sniff import AUTO_ENCODING, CsvSniffCache
+from hed_utils.support.file_utils.csv_file import count_csv_files_containing
 from hed_utils.support.file_utils.csv_file import get_csv_files_containing
-from hed_utils.support.file_utils.xlsx_file import xlsx_write_sheets_data
+from hed_utils.support.file_utils.csv_file import iter_csv_files
+from hed_utils.support.file_utils.csv_file import iter_csv_files_containing
+from hed_utils.support.file_utils.report_file import REPORT_WRITERS, get_report_writer
+from hed_utils.support.file_utils.xlsx_file import XlsxStreamWriter
+from hed_utils.support.file_utils.xlsx_file import xlsx_stream_sheets_data
+from hed_utils.support.file_utils.xlsx_file import xlsx_write_workbooks
 from hed_utils.support.text_tool import normalize
 from hed_utils.support.time_tool import Timer
 from tabulate import tabulate
@@ -59,6 +117,28 @@ def _parse_args(args):
                         type=input_folder_path,
                         default=Path.cwd(),
                         help="path to CSV files directory (default: CWD)")
+    parser.add_argument("--max-depth",
+                        dest="max_depth",
+                        action="store",
+                        type=int_value(min_value=0),
+                        default=None,
+                        help="how deep to look for CSV files in the sub-directories, 0 for the directory only "
+                             "(default: no limit)")
+    parser.add_argument("--exclude-dirs",
+                        dest="exclude_dirs",
+                        action="store",
+                        nargs="+",
+                        type=string_value,
+                        metavar="DIR",
+                        default=None,
+                        help="names (or glob patterns) of sub-directories to skip (default: none)")
+    parser.add_argument("--scan-workers",
+                        dest="scan_workers",
+                        action="store",
+                        type=int_value(min_value=1),
+                        default=None,
+                        help="list the sub-directories in parallel with this many threads, for network drives "
+                             "(default: sequential)")
     parser.add_argument("-o",
                         dest="text_report",
                         action="store",
@@ -71,45 +151,197 @@ def _parse_args(args):
                         type=output_file_path,
                         default=None,
                         help="filepath for writing excel report")
+    parser.add_argument("--excel-workbook-rows",
+                        dest="excel_workbook_rows",
+                        action="store",
+                        type=int_value(min_value=1),
+                        default=None,
+                        help="write the excel report as multiple workbooks with up to this many rows each, "
+                             "generated in parallel, with JSON manifest listing their sheets "
+                             "(ignored with --stream and --count-only) (default: single workbook)")
+    parser.add_argument("--report",
+                        dest="reports",
+                        action="append",
+                        type=output_file_path,
+                        default=[],
+                        metavar="REPORT_FILE",
+                        help="filepath for writing machine-readable report, the format is chosen by the extension: "
+                             ".csv, .jsonl, .parquet or .feather (Parquet and Feather require pyarrow), or .xlsx "
+                             "(can be repeated)")
     parser.add_argument("-e",
                         dest="encoding",
                         action="store",
                         default="utf-8",
                         type=string_value,
-                        help="encoding for opening the CSV files (default: utf-8)")
+                        help="encoding for opening the CSV files, 'auto' detects the encoding and the CSV dialect "
+                             "of each file (default: utf-8)")
     parser.add_argument("-t",
                         dest="text",
-                        action="store",
+                        action="append",
                         type=string_value,
-                        required=True,
-                        help="the text to find")
+                        default=[],
+                        help="the text to find (can be repeated to find any of multiple terms in a single pass)")
+    parser.add_argument("--terms-file",
+                        dest="terms_file",
+                        action="store",
+                        type=input_file_path,
+                        default=None,
+                        help="path to UTF-8 text file with terms to find, one per line")
     parser.add_argument("-i",
                         dest="ignorecase",
                         action="store_true",
                         help="if passed search will ignore casing (default: False)")
-
-    return parser.parse_args(args)
-
-
-def _generate_excel_report(results: list, file: str):
+    parser.add_argument("-r", "--regex",
+                        dest="regex",
+                        action="store_true",
+                        help="treat the texts as regular expressions (default: False)")
+    parser.add_argument("--columns",
+                        dest="columns",
+                        action="store",
+                        nargs="+",
+                        type=string_value,
+                        metavar="COLUMN",
+                        default=None,
+                        help="search only in the columns with these header names (default: all columns)")
+    parser.add_argument("--count-only",
+                        dest="count_only",
+                        action="store_true",
+                        help="only count the matching rows in each file, without keeping them (default: False)")
+    parser.add_argument("--limit",
+                        dest="limit",
+                        action="store",
+                        type=int_value(min_value=1),
+                        default=None,
+                        help="stop the search once this many matching rows were found (default: no limit)")
+    parser.add_argument("--stream",
+                        dest="stream",
+                        action="store_true",
+                        help="write the reports while searching, keeping bounded memory (default: False)")
+    parser.add_argument("--max-rows-in-flight",
+                        dest="max_rows_in_flight",
+                        action="store",
+                        type=int_value(min_value=1),
+                        default=10000,
+                        help="max matching rows buffered between the workers and the reports in --stream mode "
+                             "(default: 10000)")
+    parser.add_argument("--chunk-size",
+                        dest="chunk_size",
+                        action="store",
+                        type=int_value(min_value=0),
+                        default=64,
+                        help="split CSV files bigger than this many MiB into chunks that are searched in parallel "
+                             "(default: 64, 0 disables the splitting)")
+    parser.add_argument("--mmap",
+                        dest="use_mmap",
+                        action="store_true",
+                        help="search the raw bytes of memory-mapped files, decoding only the matching records "
+                             "(default: False)")
+    parser.add_argument("--index",
+                        dest="index_file",
+                        action="store",
+                        type=output_file_path,
+                        default=None,
+                        help="path to SQLite index of the CSV files (created if missing), that is updated for the "
+                             "changed files and then used to answer the search without re-scanning all files "
+                             "(--stream and --mmap are ignored)")
+    parser.add_argument("--cache",
+                        dest="cache_dir",
+                        action="store",
+                        nargs="?",
+                        type=output_folder_path,
+                        const=DEFAULT_CACHE_FOLDER,
+                        default=None,
+                        help="reuse the results for the files that were not changed since their last search, "
+                             "stored in CACHE_DIR (default: the user cache dir), can't be combined with "
+                             "--count-only, --stream, --limit and --index")
+    parser.add_argument("--cache-size",
+                        dest="cache_size",
+                        action="store",
+                        type=int_value(min_value=1),
+                        default=512,
+                        help="max size of the results cache in MiB, the least recently used entries are evicted "
+                             "(default: 512)")
+
+    args = parser.parse_args(args)
+    if not (args.text or args.terms_file):
+        parser.error("at least one of the arguments -t or --terms-file is required")
+    terms = list(args.text)
+    if args.terms_file:
+        terms.extend(_read_terms(args.terms_file))
+    args.terms = [term for term in normalize("\n".join(terms)).split("\n") if term]  # ensure encoding consistency
+    if not args.terms:
+        parser.error("there are no terms to find, the -t texts and the --terms-file lines are empty")
+    if args.cache_dir:
+        for option, used in (("--count-only", args.count_only), ("--stream", args.stream),
+                             ("--limit", args.limit), ("--index", args.index_file)):
+            if used:
+                parser.error(f"argument --cache: not allowed with argument {option}")
+    for report in args.reports:
+        if Path(report).suffix.lower() not in REPORT_WRITERS:
+            parser.error(f"unsupported --report file extension: '{report}' (expected one of: {list(REPORT_WRITERS)})")
+    return args
+
+
+def _read_terms(terms_file) -> list:
+    """Reads the non-empty (stripped) lines of the terms file."""
+
+    with open(terms_file, mode="r", encoding="utf-8") as fp:
+        return [line.strip() for line in fp if line.strip()]
+
+
+def _generate_excel_report(results: list, file: str, workbook_rows=None):
     if not file:
         _log.warning("no excel report file was set!")
         return
 
     file = abspath(file)
-    _log.info("writing excel report to: '%s'", file)
-    sheets_data = [(basename(filepath), headers, rows)
+    sheets_data = ((basename(filepath), headers, rows)
                    for filepath, headers, rows
-                   in results]
-    xlsx_write_sheets_data(file, sheets_data)
+                   in results)
+    if workbook_rows:
+        _log.info("writing excel report workbooks with up to [ %s ] rows each to: '%s'", workbook_rows, file)
+        manifest_file = xlsx_write_workbooks(file, sheets_data, max_workbook_rows=workbook_rows)
+        _log.info("excel report workbooks are listed in: '%s'", manifest_file)
+    else:
+        _log.info("writing excel report to: '%s'", file)
+        xlsx_stream_sheets_data(file, sheets_data)
 
 
-def _generate_text_report(results: list, file: str):
-    def _format_result(r):
-        filepath, headers, rows = r
-        sep = len(filepath) * "="
-        return f"\n\n{sep}\n{filepath}:\n\n{tabulate(tabular_data=rows, headers=headers)}\n"
+def _open_report(file: str, title_column):
+    """Creates the writer of the --report file, the title column is not added to .xlsx reports (sheets)."""
+
+    file = abspath(file)
+    _log.info("writing report to: '%s'", file)
+    is_xlsx = Path(file).suffix.lower() == ".xlsx"
+    return get_report_writer(file, title_column=None if is_xlsx else title_column)
+
+
+def _append_report(report, filepath, headers, rows):
+    # the sheet titles are limited to 31 chars, so the xlsx sheets are titled by the file name only
+    title = basename(filepath) if isinstance(report, XlsxStreamWriter) else filepath
+    report.append(title, headers, rows, sheet_id=filepath)
+
+
+def _generate_reports(results: list, files: list):
+    """Writes the (file, headers, rows) results to the --report files."""
+
+    for file in files:
+        with _open_report(file, "file") as report:
+            for filepath, headers, rows in results:
+                _append_report(report, filepath, headers, rows)
+
+
+def _format_title(filepath: str) -> str:
+    sep = len(filepath) * "="
+    return f"\n\n{sep}\n{filepath}:\n"
+
 
+def _format_result(r) -> str:
+    filepath, headers, rows = r
+    return f"{_format_title(filepath)}\n{tabulate(tabular_data=rows, headers=headers)}\n"
+
+
+def _generate_text_report(results: list, file: str):
     report = StringIO()
 
     for result in results:
@@ -126,6 +358,102 @@ def _generate_text_report(results: list, file: str):
         _log.warning("No text report file was set!")
 
 
+def _generate_reports_stream(batches, text_report_path, excel_report_path, report_paths=()) -> tuple:
+    """Writes the streamed (file, headers, rows) batches to the reports as they come.
+
+    :returns tuple (rows_count, files_count)
+    """
+
+    if not text_report_path:
+        _log.warning("No text report file was set!")
+    if not excel_report_path:
+        _log.warning("no excel report file was set!")
+
+    text_report = open(text_report_path, mode="w") if text_report_path else None
+    excel_report = XlsxStreamWriter(abspath(excel_report_path)) if excel_report_path else None
+    reports = []
+    rows_count, files, last_file = 0, set(), None
+    try:
+        for report_path in report_paths:
+            reports.append(_open_report(report_path, "file"))
+
+        for filepath, headers, rows in batches:
+            if filepath != last_file:
+                details = _format_result((filepath, headers, rows))
+            else:
+                details = f"\n{tabulate(tabular_data=rows, headers=headers)}\n"
+            last_file = filepath
+
+            print(details)
+            if text_report:
+                print(details, file=text_report)
+            if excel_report:
+                excel_report.append(basename(filepath), headers, rows, sheet_id=filepath)
+            for report in reports:
+                _append_report(report, filepath, headers, rows)
+
+            rows_count += len(rows)
+            files.add(filepath)
+    finally:
+        if text_report:
+            _log.info("wrote text report to file: '%s'", text_report_path)
+            text_report.close()
+        if excel_report:
+            _log.info("writing excel report to: '%s'", excel_report.file)
+            excel_report.close()
+        for report in reports:
+            report.close()
+
+    return rows_count, len(files)
+
+
+def _limit_results(results: list, limit) -> list:
+    """Truncates the (file, headers, rows) results to the first limit rows in total."""
+
+    limited = []
+    for filepath, headers, rows in results:
+        if limit <= 0:
+            break
+        limited.append((filepath, headers, rows[:limit]))
+        limit -= len(rows)
+    return limited
+
+
+def _limit_batches(batches, limit):
+    """Yields the streamed (file, headers, rows) batches until limit rows in total, then stops the stream."""
+
+    for filepath, headers, rows in batches:
+        yield filepath, headers, rows[:limit]
+        limit -= len(rows)
+        if limit <= 0:
+            batches.close()
+            return
+
+
+def _generate_counts_reports(counts: list, text_report_path, excel_report_path, report_paths=()):
+    """Writes the (file, count) results, as table sorted by count."""
+
+    counts = sorted(counts, key=(lambda r: r[1]), reverse=True)
+    headers = ["file", "matching_rows"]
+    report = tabulate(tabular_data=counts, headers=headers)
+    print(report)
+
+    if text_report_path:
+        _log.info("writing text report to file: '%s'", text_report_path)
+        with open(text_report_path, mode="w") as fp:
+            fp.write(report)
+
+    if excel_report_path:
+        _log.info("writing excel report to: '%s'", abspath(excel_report_path))
+        xlsx_stream_sheets_data(abspath(excel_report_path), [("counts", headers, (list(row) for row in counts))])
+    else:
+        _log.warning("no excel report file was set!")
+
+    for report_path in report_paths:
+        with _open_report(report_path, None) as report:
+            report.append("counts", headers, counts)
+
+
 def _init_logging(level):
     from hed_utils.support import log
     log.init(level=level, log_format=LOG_FORMAT)
@@ -143,35 +471,81 @@ def main(args):
 
     # extract args
     encoding = args.encoding
-    text = normalize(args.text.strip())  # ensure encoding consistency
+    terms = args.terms
+    text = terms[0] if (len(terms) == 1) else terms
     directory = abspath(args.directory)
     text_report_path = args.text_report
     excel_report_path = args.excel_report
-    verbose = args.verbose
+    log_level = args.log_level
     ignorecase = args.ignorecase
+    search_options = dict(regex=args.regex, columns=args.columns)
+    sniff_cache = CsvSniffCache() if (encoding == AUTO_ENCODING) else None
 
-    _init_logging(verbose)
+    _init_logging(log_level)
 
     # measure the program execution time
     search_timer = Timer()
     search_timer.start()
 
-    # perform the search
-    csv_files = [file for file in get_csv_files(directory)]
-    results = get_csv_files_containing(csv_files, text, ignorecase=ignorecase, encoding=encoding)
-    search_timer.stop()
-
-    # generate reports if needed
-    if results:
-        results.sort(key=(lambda r: len(r[-1])), reverse=True)
-        _generate_text_report(results, text_report_path)
-        _generate_excel_report(results, excel_report_path)
+    # perform the search (the files are discovered lazily, so the scanning starts with the first found files)
+    csv_files = iter_csv_files(directory, max_depth=args.max_depth, exclude_dirs=args.exclude_dirs,
+                               workers=args.scan_workers)
+    if args.count_only:
+        if args.index_file:
+            with CsvIndex(args.index_file) as index:
+                index.update(csv_files, encoding=encoding)
+                counts = index.count(text, ignorecase=ignorecase, limit=args.limit, **search_options)
+        else:
+            counts = count_csv_files_containing(csv_files, text, ignorecase=ignorecase, encoding=encoding,
+                                                chunk_size=(args.chunk_size * 1024 * 1024), use_mmap=args.use_mmap,
+                                                sniff_cache=sniff_cache, limit=args.limit, **search_options)
+        search_timer.stop()
+        if counts:
+            _generate_counts_reports(counts, text_report_path, excel_report_path, args.reports)
+        else:
+            _log.warning("No results were found!")
+        rows_count = sum(count for _, count in counts)
+        files_count = len(counts)
+    elif args.stream and not args.index_file:
+        batches = iter_csv_files_containing(csv_files, text, ignorecase=ignorecase, encoding=encoding,
+                                            max_rows_in_flight=args.max_rows_in_flight, use_mmap=args.use_mmap,
+                                            sniff_cache=sniff_cache, **search_options)
+        if args.limit:
+            batches = _limit_batches(batches, args.limit)
+        rows_count, files_count = _generate_reports_stream(batches, text_report_path, excel_report_path,
+                                                           args.reports)
+        search_timer.stop()
+        if not rows_count:
+            _log.warning("No results were found!")
     else:
-        _log.warning("No results were found!")
+        if args.index_file:
+            with CsvIndex(args.index_file) as index:
+                index.update(csv_files, encoding=encoding)
+                results = index.search(text, ignorecase=ignorecase, **search_options)
+            if args.limit:
+                results = _limit_results(results, args.limit)
+        else:
+            cache = CsvResultCache(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache_dir else None
+            results = get_csv_files_containing(csv_files, text, ignorecase=ignorecase, encoding=encoding,
+                                               chunk_size=(args.chunk_size * 1024 * 1024), use_mmap=args.use_mmap,
+                                               cache=cache, sniff_cache=sniff_cache, limit=args.limit,
+                                               **search_options)
+        search_timer.stop()
+
+        # generate reports if needed
+        if results:
+            results.sort(key=(lambda r: len(r[-1])), reverse=True)
+            _generate_text_report(results, text_report_path)
+            _generate_excel_report(results, excel_report_path, args.excel_workbook_rows)
+            _generate_reports(results, args.reports)
+        else:
+            _log.warning("No results were found!")
+
+        rows_count = sum([len(result[-1]) for result in results])
+        files_count = len(results)
 
-    rows_count = sum([len(result[-1]) for result in results])
     _log.info("All Done! Found [ %s ] matching rows in [ %s ] different files (took: %.3f s.)",
-              rows_count, len(results), search_timer.elapsed)
+              rows_count, files_count, search_timer.elapsed)
 
 
 def run():
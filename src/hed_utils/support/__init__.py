@@ -6,6 +6,7 @@ from hed_utils.support import obj
 from hed_utils.support import os_type
 from hed_utils.support import profiler
 from hed_utils.support import ps_tool
+from hed_utils.support import scheduler
 from hed_utils.support import table
 from hed_utils.support import text_tool
 from hed_utils.support import time_tool
@@ -20,6 +21,7 @@ __all__ = [
     "os_type",
     "profiler",
     "ps_tool",
+    "scheduler",
     "table",
     "text_tool",
     "time_tool",
@@ -1,10 +1,13 @@
 from hed_utils.support.file_utils.file_sys import (
     Contents,
+    ScanContents,
     format_size,
     time_stamp,
     walk_contents,
     walk_files,
     walk_dirs,
+    scan_contents,
+    scan_files,
     delete_file,
     delete_folder,
     prepare_tmp_location,
@@ -13,46 +16,102 @@ from hed_utils.support.file_utils.file_sys import (
     view_file
 )
 
+from hed_utils.support.file_utils.compressed_file import get_file_stat, is_compressed, open_file
 from hed_utils.support.file_utils.csv_file import (
+    count_csv_files_containing,
     get_csv_rows_containing,
     get_csv_files,
-    get_csv_files_containing
+    get_csv_files_containing,
+    iter_csv_files,
+    iter_csv_files_containing
 )
+from hed_utils.support.file_utils.csv_cache import CsvResultCache
+from hed_utils.support.file_utils.csv_index import CsvIndex
+from hed_utils.support.file_utils.csv_sniff import CsvSniffCache, sniff_csv_file
 
 from hed_utils.support.file_utils.json_file import read_json, write_json
+from hed_utils.support.file_utils.mmap_file import mmap_safe_encoding, open_mmap
+from hed_utils.support.file_utils.report_file import (
+    REPORT_WRITERS,
+    CsvReportWriter,
+    FeatherReportWriter,
+    JsonLinesReportWriter,
+    ParquetReportWriter,
+    get_report_writer,
+    write_report
+)
 from hed_utils.support.file_utils.text_file import (
+    TextHit,
     iter_files_containing_text_in_lines,
+    iter_lines_containing_text,
+    iter_text_hits_in_lines,
     text_in_lines,
     view_text,
     write_text
 )
-from hed_utils.support.file_utils.xlsx_file import xlsx_workbook_from_sheets_data, xlsx_write_sheets_data
+from hed_utils.support.file_utils.xlsx_file import (
+    XlsxStreamWriter,
+    xlsx_read_sheets_data,
+    xlsx_stream_sheets_data,
+    xlsx_workbook_from_sheets_data,
+    xlsx_write_sheets_data,
+    xlsx_write_workbooks
+)
 from hed_utils.support.file_utils.zip_file import extract_zip, zip_dir
 
 __all__ = [
     "Contents",
     "copy",
+    "CsvIndex",
+    "CsvReportWriter",
+    "CsvResultCache",
+    "CsvSniffCache",
     "copy_to_tmp",
+    "count_csv_files_containing",
     "delete_file",
     "delete_folder",
     "extract_zip",
+    "FeatherReportWriter",
     "format_size",
     "get_csv_rows_containing",
+    "get_file_stat",
+    "get_report_writer",
+    "is_compressed",
+    "iter_csv_files",
+    "iter_csv_files_containing",
     "iter_files_containing_text_in_lines",
+    "iter_lines_containing_text",
+    "iter_text_hits_in_lines",
+    "JsonLinesReportWriter",
+    "mmap_safe_encoding",
+    "open_file",
+    "open_mmap",
+    "ParquetReportWriter",
     "prepare_tmp_location",
     "read_json",
+    "REPORT_WRITERS",
+    "ScanContents",
+    "scan_contents",
+    "scan_files",
+    "sniff_csv_file",
     "text_in_lines",
+    "TextHit",
     "time_stamp",
     "view_file",
     "view_text",
+    "XlsxStreamWriter",
+    "xlsx_read_sheets_data",
+    "xlsx_stream_sheets_data",
     "xlsx_workbook_from_sheets_data",
     "xlsx_write_sheets_data",
+    "xlsx_write_workbooks",
     "walk_contents",
     "get_csv_files",
     "get_csv_files_containing",
     "walk_dirs",
     "walk_files",
     "write_json",
+    "write_report",
     "write_text",
     "zip_dir"
 ]
@@ -0,0 +1,110 @@
+"""Transparent reading of compressed files (.gz, .bz2, .xz) and of members inside .zip archives.
+
+The zip members are addressed like in zipfile.Path: '<archive path>/<member name>' (e.g. '/exports/may.zip/a.csv'),
+and are streamed from the archive without extracting it.
+"""
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import os
+import zipfile
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+_log = logging.getLogger(__name__)
+_log.addHandler(logging.NullHandler())
+
+ZIP_SUFFIX = ".zip"
+
+_DECOMPRESSORS = {".gz": gzip.open,
+                  ".bz2": bz2.open,
+                  ".xz": lzma.open}
+
+COMPRESSED_SUFFIXES = tuple(_DECOMPRESSORS)
+
+
+def split_zip_member(file: Union[str, Path]) -> Optional[Tuple[str, str]]:
+    """Returns tuple (archive, member) if the path points to a member inside a zip archive, None otherwise.
+
+    It's called for each file several times (stat, open), so only the paths with '.zip' directory are checked
+    on the disk, and the result is memoized for them.
+    """
+
+    path = str(file)
+    lowered = path.lower()
+    if ((ZIP_SUFFIX + "/") not in lowered) and ((ZIP_SUFFIX + os.sep) not in lowered):
+        return None
+    return _split_zip_path(path)
+
+
+@lru_cache(maxsize=4096)
+def _split_zip_path(file: str) -> Optional[Tuple[str, str]]:
+    path = Path(file)
+    if path.exists():
+        return None
+
+    for parent in path.parents:
+        if (parent.suffix.lower() == ZIP_SUFFIX) and parent.is_file():
+            return str(parent), path.relative_to(parent).as_posix()
+    return None
+
+
+def is_compressed(file: Union[str, Path]) -> bool:
+    """Checks if the file is decompressed while reading (compressed file, or member of zip archive)."""
+
+    return (Path(file).suffix.lower() in _DECOMPRESSORS) or (split_zip_member(file) is not None)
+
+
+def get_file_stat(file: Union[str, Path]) -> os.stat_result:
+    """Returns the stat of the file, or the stat of the archive for zip members."""
+
+    member = split_zip_member(file)
+    return os.stat(member[0] if member else file)
+
+
+def get_zip_members(archive: Union[str, Path], suffixes: Tuple[str, ...]) -> List[str]:
+    """Returns the paths to the members of the zip archive that end with any of the suffixes (case insensitive)."""
+
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            names = [info.filename for info in zf.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile):
+        _log.exception("Could not read zip archive: '%s'", archive)
+        return []
+
+    return [str(Path(archive).joinpath(name))
+            for name in names
+            if name.lower().endswith(suffixes)]
+
+
+def _wrap(fp, mode, encoding, newline):
+    return fp if ("b" in mode) else io.TextIOWrapper(fp, encoding=encoding, newline=newline)
+
+
+@contextmanager
+def open_file(file: Union[str, Path], mode="r", encoding=None, newline=None):
+    """Opens plain file, compressed file or zip member for reading, as binary ('rb') or text ('r') stream."""
+
+    if mode not in ("r", "rb"):
+        raise ValueError(f"unsupported mode: '{mode}'")
+
+    member = split_zip_member(file)
+    if member:
+        archive, name = member
+        with zipfile.ZipFile(archive) as zf:
+            with zf.open(name) as fp:
+                yield _wrap(fp, mode, encoding, newline)
+        return
+
+    decompressor = _DECOMPRESSORS.get(Path(file).suffix.lower())
+    if decompressor is None:
+        with open(file, mode=mode, encoding=encoding, newline=newline) as fp:
+            yield fp
+        return
+
+    with decompressor(file, mode="rb") as fp:
+        yield _wrap(fp, mode, encoding, newline)
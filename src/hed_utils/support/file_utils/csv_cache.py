@@ -0,0 +1,109 @@
+"""Cache of CSV search results, so the unchanged files are not scanned again on repeated searches.
+
+Each entry is stored as separate JSON file in the cache folder, keyed on the file fingerprint (path, size, mtime)
+and the search options. The least recently used entries are evicted when the cache grows over its max size.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from appdirs import user_cache_dir
+
+from hed_utils.support.file_utils.compressed_file import get_file_stat
+from hed_utils.support.file_utils.csv_file import get_dialect_name
+
+_log = logging.getLogger(__name__)
+_log.addHandler(logging.NullHandler())
+
+DEFAULT_CACHE_FOLDER = Path(user_cache_dir("hed_utils")).joinpath("csv_search")
+
+DEFAULT_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+_ENTRY_SUFFIX = ".json"
+
+
+class CsvResultCache:
+    """Size bounded LRU cache of the (headers, rows) found in CSV files, for use with get_csv_files_containing.
+
+    Usage:
+
+        cache = CsvResultCache()
+        results = get_csv_files_containing(files, "text", True, "utf-8", cache=cache)
+    """
+
+    def __init__(self, folder: Union[str, Path] = DEFAULT_CACHE_FOLDER, max_size=DEFAULT_CACHE_MAX_SIZE):
+        self.folder = Path(folder).absolute()
+        self.max_size = max_size
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def _get_entry_path(self, file: str, text, ignorecase, encoding, dialect, regex, columns) -> Path:
+        terms = [text] if isinstance(text, str) else list(text)
+        if ignorecase and (not regex):
+            terms = [term.lower() for term in terms]
+
+        file = str(Path(file).absolute())
+        file_stat = get_file_stat(file)
+        key = json.dumps([file, file_stat.st_size, file_stat.st_mtime_ns, encoding, get_dialect_name(dialect),
+                          list(dict.fromkeys(terms)), ignorecase, regex, list(columns) if columns else None])
+        return self.folder.joinpath(hashlib.sha1(key.encode("utf-8")).hexdigest() + _ENTRY_SUFFIX)
+
+    def get(self, file: str, text: Union[str, Iterable[str]], ignorecase: bool, encoding, dialect="excel", *,
+            regex=False, columns=None) -> Optional[tuple]:
+        """Returns the cached (headers, rows) for the file, or None if the file was changed or not searched yet.
+
+        The search options are the same as the ones of get_csv_files_containing."""
+
+        entry_path = self._get_entry_path(file, text, ignorecase, encoding, dialect, regex, columns)
+        try:
+            with open(entry_path, mode="r", encoding="utf-8") as fp:
+                headers, rows = json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+        now = time.time_ns()
+        os.utime(entry_path, ns=(now, now))  # mark as recently used (the implicit time is too coarse)
+        return headers, rows
+
+    def put(self, file: str, text: Union[str, Iterable[str]], ignorecase: bool, encoding, dialect, headers, rows, *,
+            regex=False, columns=None):
+        """Stores the search result for the file."""
+
+        entry_path = self._get_entry_path(file, text, ignorecase, encoding, dialect, regex, columns)
+        tmp_path = entry_path.with_suffix(".tmp")
+        with open(tmp_path, mode="w", encoding="utf-8") as fp:
+            json.dump([list(headers), rows], fp, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+
+    def evict(self) -> int:
+        """Removes the least recently used entries until the cache size fits in max_size.
+
+        :returns the count of removed entries
+        """
+
+        entries = []
+        for entry_path in self.folder.glob("*" + _ENTRY_SUFFIX):
+            try:
+                entry_stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                entry_path.unlink()
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+
+        if removed:
+            _log.debug("evicted [ %s ] entries from the CSV results cache at: '%s'", removed, self.folder)
+        return removed
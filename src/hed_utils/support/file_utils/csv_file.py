@@ -1,75 +1,1081 @@
+import codecs
 import csv
 import logging
+import multiprocessing
+import os
+import re
 from concurrent.futures import ProcessPoolExecutor
-from os import walk
-from os.path import abspath, join
+from contextlib import contextmanager
+from io import StringIO
+from os.path import abspath
 from pathlib import Path
-from typing import List, Union
+from queue import Empty
+from typing import Generator, Iterable, Iterator, List, Optional, Union
+
+from more_itertools import chunked
+
+from hed_utils.support.file_utils.compressed_file import (
+    COMPRESSED_SUFFIXES,
+    ZIP_SUFFIX,
+    get_file_stat,
+    get_zip_members,
+    is_compressed,
+    open_file
+)
+from hed_utils.support.file_utils.csv_sniff import AUTO_ENCODING, sniff_csv_file
+from hed_utils.support.file_utils.file_sys import scan_files
+from hed_utils.support.file_utils.mmap_file import mmap_safe_encoding, open_mmap
+from hed_utils.support.scheduler import LptScheduler
+from hed_utils.support.text_tool import compile_terms_pattern
 
 _log = logging.getLogger(__name__)
 _log.addHandler(logging.NullHandler())
 
+CSV_SUFFIXES = (".csv",) + tuple(".csv" + suffix for suffix in COMPRESSED_SUFFIXES)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024  # files bigger than this are scanned in parallel chunks
+
+MATCHED_TERMS_HEADER = "matched_terms"  # extra column added to the results of multi-term searches
+
+_READ_BLOCK_SIZE = 1024 * 1024
+_JOINED_FIELDS_SEPARATOR = "\x00"  # joins the fields of a row for lowercasing them at once
+_PREFILTER_BLOCK_SIZE = 1024 * 1024  # chars
+
+# set in each worker process of the streaming pool by _init_stream_worker
+_stream_queue = None
+_stream_cancelled = None
+
+# set in each worker process of the search pool by _init_search_worker
+_search_counter = None
+_search_limit = None
+_search_count_only = False
+
+
+def iter_csv_files(folder: Union[str, Path],
+                   *,
+                   max_depth: Optional[int] = None,
+                   exclude_dirs: Optional[Iterable[str]] = None,
+                   workers: Optional[int] = None) -> Generator[str, None, None]:
+    """Lazily yields absolute paths to CSV files discovered in the given folder, as they are found.
 
-def get_csv_files(folder: Union[str, Path]) -> List[str]:
-    """Returns list with absolute paths to CSV files discovered in the given folder."""
+    Compressed CSV files (.csv.gz, .csv.bz2, .csv.xz) and the CSV members of zip archives
+    (as '<archive>/<member>' paths, see compressed_file) are included, they are decompressed while searching.
+
+    The max_depth, exclude_dirs and workers (parallel scan of network folders) are passed to file_sys.scan_files.
+    """
 
     folder = abspath(folder)
     _log.debug("getting CSV files in: '%s'", folder)
-    return [join(dirpath, filename)
-            for (dirpath, _, filenames) in walk(folder, topdown=False)
-            for filename in filenames
-            if filename.lower().endswith(".csv")]
+    for entry in scan_files(folder, suffixes=CSV_SUFFIXES + (ZIP_SUFFIX,),
+                            max_depth=max_depth, exclude_dirs=exclude_dirs, workers=workers):
+        if entry.name.lower().endswith(ZIP_SUFFIX):
+            yield from get_zip_members(entry.path, CSV_SUFFIXES[:1])
+        else:
+            yield entry.path
+
+
+def get_csv_files(folder: Union[str, Path],
+                  *,
+                  max_depth: Optional[int] = None,
+                  exclude_dirs: Optional[Iterable[str]] = None,
+                  workers: Optional[int] = None) -> List[str]:
+    """Returns list with absolute paths to CSV files discovered in the given folder (see iter_csv_files)."""
+
+    return list(iter_csv_files(folder, max_depth=max_depth, exclude_dirs=exclude_dirs, workers=workers))
+
+
+class _Needle:
+    """The text (or multiple terms) to find in the CSV rows, prepared for the raw and for the per-field search.
+
+    Multi-term searches scan each row once for all of the terms (see text_tool.compile_terms_pattern),
+    and tag the matching rows with the matched terms in an extra MATCHED_TERMS_HEADER column.
+
+    In regex mode the terms are regular expressions searched in each field (case is ignored with re.IGNORECASE).
+    When columns (header names) are given, only the fields in these columns are checked.
+    """
+
+    def __init__(self, text: Union[str, Iterable[str]], ignorecase: bool, *, regex=False, columns=None):
+        terms = [text] if isinstance(text, str) else list(text)
+        if ignorecase and (not regex):
+            terms = [term.lower() for term in terms]
+
+        self.terms = tuple(dict.fromkeys(terms))
+        self.ignorecase = ignorecase
+        self.regex = regex
+        self.columns = tuple(columns) if columns else None
+        self.tagged = len(self.terms) > 1
+        if regex:
+            flags = re.IGNORECASE if ignorecase else 0
+            self._term_patterns = [re.compile(term, flags) for term in self.terms]
+            self._pattern = re.compile("|".join(f"(?:{term})" for term in self.terms), flags)
+        else:
+            self._pattern = compile_terms_pattern(self.terms) if self.tagged else None
+
+    def __str__(self):
+        return f"{len(self.terms)} terms" if self.tagged else self.terms[0]
+
+    def contains(self, char: str) -> bool:
+        """Checks if any of the terms contains the char."""
+
+        return any((char in term) for term in self.terms)
+
+    def is_ascii(self) -> bool:
+        try:
+            for term in self.terms:
+                term.encode("ascii")
+        except UnicodeEncodeError:
+            return False
+        return True
+
+    def raw_finder(self, encoding=None):
+        """Returns function(haystack, start, end) -> position of the first hit in haystack[start:end] or -1.
+
+        The haystack is raw text, or raw bytes if encoding is passed. It's expected to be lowered if ignorecase."""
+
+        terms = self.terms if (encoding is None) else [term.encode(encoding) for term in self.terms]
+        if len(terms) == 1:
+            term = terms[0]
+            return lambda haystack, start, end: haystack.find(term, start, end)
+
+        pattern = compile_terms_pattern(terms)
+
+        def find(haystack, start, end):
+            match = pattern.search(haystack, start, end)
+            return match.start() if match else -1
+
+        return find
+
+    def tag_headers(self, headers):
+        """Adds the matched terms column to non-empty headers of multi-term searches."""
+
+        return (list(headers) + [MATCHED_TERMS_HEADER]) if (self.tagged and headers) else headers
+
+    def column_indices(self, headers) -> Optional[List[int]]:
+        """Resolves the searched columns to indices in the headers (None if all columns are searched)."""
+
+        if self.columns is None:
+            return None
+
+        indices = [index for index, header in enumerate(headers or ()) if header in self.columns]
+        if len(indices) < len(self.columns):
+            _log.debug("some of the searched columns %s are missing in the headers: %s", self.columns, headers)
+        return indices
+
+    def _get_fields_preparer(self):
+        """Returns function(fields) -> list of texts to search the terms in (lowered if ignorecase)."""
+
+        if self.regex or (not self.ignorecase):
+            return lambda fields: fields
+
+        if self.contains(_JOINED_FIELDS_SEPARATOR):
+            return lambda fields: [item.lower() for item in fields]
+
+        # lowercase the joined fields once per row instead of allocating lowered copy of each field,
+        # the separator is not part of any term, so the hits are always within single field
+        join = _JOINED_FIELDS_SEPARATOR.join
+        return lambda fields: [join(fields).lower()]
+
+    def filter_rows(self, records, indices=None):
+        """Yields the parsed CSV records that contain the text (or any of the terms) in any of their fields.
+
+        :argument indices
+            If passed, only the fields at these indices are checked (see column_indices).
+        """
+
+        prepare = self._get_fields_preparer()
+        if indices is None:
+            records = ((row, row) for row in records)
+        else:
+            records = ((row, [row[index] for index in indices if index < len(row)]) for row in records)
+
+        if not (self.tagged or self.regex):
+            text = self.terms[0]
+            for row, fields in records:
+                for item in prepare(fields):
+                    if text in item:
+                        yield row
+                        break
+            return
+
+        search = self._pattern.search
+        if self.regex:
+            term_matchers = [pattern.search for pattern in self._term_patterns]
+        else:
+            term_matchers = [(lambda item, term=term: term in item) for term in self.terms]
+
+        for row, fields in records:
+            items = prepare(fields)
+            if any(search(item) for item in items):
+                if self.tagged:
+                    matched = [term for term, match in zip(self.terms, term_matchers) if any(map(match, items))]
+                    yield row + [", ".join(matched)]
+                else:
+                    yield row
+
+
+def _get_prefilter_quotechar(needle: _Needle, dialect) -> Optional[str]:
+    """Returns the dialect quote char if records containing the needle can be found in the raw text, None otherwise.
+
+    The raw text can be searched directly when the quotes are tracked without parsing (no escapechar,
+    doubled quote chars inside the quoted fields), and when the needle is plain text that does not contain
+    the quote char (which is doubled in the raw text)."""
+
+    dialect = csv.get_dialect(dialect) if isinstance(dialect, str) else dialect
+    if dialect.escapechar or (dialect.quoting == csv.QUOTE_NONE) or (not dialect.quotechar) \
+            or (not dialect.doublequote):
+        return None
+    if needle.regex or needle.contains(dialect.quotechar):
+        return None
+    return dialect.quotechar
+
+
+def _can_mmap(needle: _Needle, encoding, dialect) -> bool:
+    """Checks if CSV records containing the needle can be found by searching the raw bytes of the file.
+
+    Requires encoding that is safe for raw bytes search, prefilter-able needle and dialect, needle without newlines
+    (which are not translated), and ASCII needle if ignorecase (only ASCII letters are case-folded at bytes level)."""
+
+    if (mmap_safe_encoding(encoding) is None) or (_get_prefilter_quotechar(needle, dialect) is None):
+        return False
+    if needle.contains("\n") or needle.contains("\r"):
+        return False
+    dialect = csv.get_dialect(dialect) if isinstance(dialect, str) else dialect
+    if ord(dialect.delimiter) > 127:
+        return False
+    return needle.is_ascii() if needle.ignorecase else True
+
+
+def _get_quoted_field_pattern(dialect, quotechar):
+    """Compiles pattern matching whole quoted field (str or bytes, like the quotechar), at field boundaries.
+
+    Quote chars outside of such fields (e.g. inside unquoted field: 1,5" screen,hay) are accepted by csv.reader,
+    but break the tracking of the quoted fields by counting the quote chars (see _has_stray_quotes)."""
+
+    dialect = csv.get_dialect(dialect) if isinstance(dialect, str) else dialect
+    quote, delimiter = re.escape(dialect.quotechar), re.escape(dialect.delimiter)
+    # the opening quote is matched first (fast literal scan), then checked to be at field start
+    pattern = (f"{quote}(?<![^{delimiter}\\n]{quote})[^{quote}]*(?:{quote}{quote}[^{quote}]*)*{quote}"
+               f"(?![^{delimiter}\\r\\n])")
+    return re.compile(pattern if isinstance(quotechar, str) else pattern.encode("ascii"))
+
+
+def _has_stray_quotes(block, end: int, quotechar, quoted_field) -> bool:
+    """Checks if block[:end] has quote chars that are not part of well-formed quoted fields.
+
+    The block must start at record boundary."""
+
+    if block.find(quotechar, 0, end) == -1:
+        return False
+    return quotechar in quoted_field.sub(block[:0], block[:end])
+
+
+class _MisalignedChunkError(Exception):
+    """Raised for file chunk with quote chars outside of quoted fields, as its boundaries may be wrong."""
+
+
+def _check_chunk_quotes(data: bytes, dialect):
+    """Checks that the quote chars in the (raw, ASCII-compatible) chunk data are only in well-formed quoted fields.
 
+    The chunk boundaries are found by counting the quote chars (see _get_chunk_ranges). A stray quote char
+    (e.g. 1,5" screen,hay) flips the counted parity, and all the following boundaries are wrong.
+    The first chunk having such quote char still starts at record boundary, so it's found by checking every chunk.
 
-def get_csv_rows_containing(file, text, ignorecase, encoding, dialect="excel"):
+    :raises _MisalignedChunkError
+    """
+
+    dialect = csv.get_dialect(dialect) if isinstance(dialect, str) else dialect
+    quotechar = dialect.quotechar.encode("ascii")
+    if _has_stray_quotes(data, len(data), quotechar, _get_quoted_field_pattern(dialect, quotechar)):
+        raise _MisalignedChunkError()
+
+
+def _iter_raw_lines(block, fp, encoding=None, stop=None):
+    """Yields the (decoded) lines of the block, followed by the lines of the rest of the stream (up to stop)."""
+
+    newline_char = "\n" if (encoding is None) else b"\n"
+    carry = block
+    while True:
+        size = _PREFILTER_BLOCK_SIZE if (stop is None) else max(0, min(_PREFILTER_BLOCK_SIZE, stop - fp.tell()))
+        data = fp.read(size)
+        carry += data
+        end = (carry.rfind(newline_char) + 1) if data else len(carry)
+        i = 0
+        while i < end:
+            j = carry.find(newline_char, i, end)
+            j = end if (j == -1) else (j + 1)
+            yield carry[i:j] if (encoding is None) else _decode_line(carry[i:j], encoding)
+            i = j
+        carry = carry[end:]
+        if not data:
+            return
+
+
+def _last_record_boundary(block, quotechar) -> int:
+    """Returns the position after the last newline in the (str or bytes) block that is not inside quoted field.
+
+    Returns 0 if there is no such newline."""
+
+    newline_char = "\n" if isinstance(block, str) else b"\n"
+    newline = block.rfind(newline_char)
+    if newline == -1:
+        return 0
+
+    quoted = block.count(quotechar, 0, newline) & 1
+    while quoted:
+        previous = block.rfind(newline_char, 0, newline)
+        if previous == -1:
+            return 0
+        quoted ^= block.count(quotechar, previous, newline) & 1
+        newline = previous
+    return newline + 1
+
+
+def _decode_line(line: bytes, encoding) -> str:
+    """Decodes raw line, translating the newlines like the text-mode files do."""
+
+    return line.decode(encoding).replace("\r\n", "\n")
+
+
+def _iter_block_candidates(block, end: int, find, ignorecase, dialect, quotechar, encoding=None):
+    """Yields the parsed records from block[:end] whose raw text contains hits of the find function.
+
+    The block must start at record boundary and end (at the end position) at record boundary.
+    Only the records around the raw hits are parsed, everything else is skipped with str.find
+
+    When encoding is passed, the block and quotechar are bytes, and only the records around the hits are decoded.
+    """
+
+    haystack = block.lower() if ignorecase else block
+    if len(haystack) != len(block):
+        # lowercasing changed the char positions, so the hits can't be mapped back to the block
+        yield from csv.reader(StringIO(block[:end]), dialect=dialect)
+        return
+
+    newline_char = "\n" if (encoding is None) else b"\n"
+    cursor, consumed = 0, [0]
+
+    def iter_lines(start):
+        i = start
+        while i < end:
+            j = block.find(newline_char, i, end)
+            j = end if (j == -1) else (j + 1)
+            consumed[0] = j
+            yield block[i:j] if (encoding is None) else _decode_line(block[i:j], encoding)
+            i = j
+
+    while True:
+        hit = find(haystack, cursor, end)
+        if hit == -1:
+            return
+
+        # move back to the start of the record containing the hit (newline that is not inside quoted field)
+        start = block.rfind(newline_char, cursor, hit) + 1 or cursor
+        quoted = block.count(quotechar, cursor, start) & 1
+        while quoted:
+            previous = block.rfind(newline_char, cursor, start - 1) + 1 or cursor
+            quoted ^= block.count(quotechar, previous, start) & 1
+            start = previous
+
+        consumed[0] = start
+        record = next(csv.reader(iter_lines(start), dialect=dialect), None)
+        cursor = max(consumed[0], hit + 1)
+        if record is not None:
+            yield record
+
+
+def _iter_candidate_records(fp, find, ignorecase, dialect, quotechar, encoding=None, stop=None):
+    """Reads the stream in blocks cut at record boundaries, yielding the records with hits of the find function.
+
+    When encoding is passed the stream is binary (e.g. mmap), and reading stops at the stop position (if passed).
+
+    If a quote char is found outside of a quoted field, the quoted fields can't be tracked by counting
+    the quote chars anymore, so all the remaining records are parsed instead.
+    """
+
+    quoted_field = _get_quoted_field_pattern(dialect, quotechar)
+    carry = "" if (encoding is None) else b""
+    while True:
+        size = _PREFILTER_BLOCK_SIZE if (stop is None) else max(0, min(_PREFILTER_BLOCK_SIZE, stop - fp.tell()))
+        data = fp.read(size)
+        block = carry + data
+        if not block:
+            return
+
+        end = _last_record_boundary(block, quotechar) if data else len(block)
+        if not end:
+            carry = block  # the block holds only part of a (very long) record
+            continue
+
+        if _has_stray_quotes(block, end, quotechar, quoted_field):
+            _log.debug("found quote char outside of quoted field, parsing all the remaining records...")
+            yield from csv.reader(_iter_raw_lines(block, fp, encoding, stop), dialect=dialect)
+            return
+
+        carry = block[end:]
+        yield from _iter_block_candidates(block, end, find, ignorecase, dialect, quotechar, encoding)
+        if not data:
+            return
+
+
+def _iter_rows_containing(fp, needle: _Needle, dialect, *, encoding=None, stop=None, indices=None):
+    """Yields the CSV rows read from the text stream that contain the needle.
+
+    When possible, the raw text is searched first and only the records around the hits are parsed,
+    which is much faster than parsing every record for rare texts.
+    Once a quote char is found outside of a quoted field (not RFC 4180), the rest of the records are parsed.
+
+    When encoding is passed, fp is memory-mapped file (checked with _can_mmap) searched as raw bytes up to stop.
+
+    When indices are passed, only the fields at these indices are checked (see _Needle.column_indices).
+    """
+
+    quotechar = _get_prefilter_quotechar(needle, dialect)
+    if quotechar is None:
+        records = csv.reader(fp, dialect=dialect)
+    elif encoding is None:
+        records = _iter_candidate_records(fp, needle.raw_finder(), needle.ignorecase, dialect, quotechar)
+    else:
+        needle_encoding = mmap_safe_encoding(encoding)
+        records = _iter_candidate_records(fp, needle.raw_finder(needle_encoding), needle.ignorecase, dialect,
+                                          quotechar.encode(needle_encoding), encoding, stop)
+
+    yield from needle.filter_rows(records, indices)
+
+
+def _read_headers(file, encoding, dialect) -> list:
+    """Parses the first record of the CSV file."""
+
+    with open_file(file, mode="r", encoding=encoding) as fp:
+        return next(csv.reader(fp, dialect=dialect), [])
+
+
+def _read_mmap_record(mm, encoding, dialect) -> Optional[list]:
+    """Parses the CSV record at the current position of the memory-mapped file."""
+
+    def iter_lines():
+        line = mm.readline()
+        while line:
+            yield _decode_line(line, encoding)
+            line = mm.readline()
+
+    return next(csv.reader(iter_lines(), dialect=dialect), None)
+
+
+@contextmanager
+def _open_csv_rows_containing(file, needle: _Needle, encoding, dialect, use_mmap, start=0, end=None):
+    """Opens the CSV file (or the [start, end) byte range of it) for searching rows that contain the needle.
+
+    The range must start and end at record boundaries (ranges are not supported for compressed files),
+    _MisalignedChunkError is raised if the range has quote chars outside of quoted fields (see _check_chunk_quotes).
+
+    :argument use_mmap
+        If True (and the needle/encoding/dialect allow it) the raw bytes of the memory-mapped file are searched,
+        and only the records around the hits are decoded.
+
+    :yields tuple with format: (headers, rows)
+        headers is None if the range does not start at the beginning of the file, () if the file is empty,
+        rows is a lazy iterator of the matching rows
+    """
+
+    if use_mmap and _can_mmap(needle, encoding, dialect) and (not is_compressed(file)):
+        with open_mmap(file) as mm:
+            if mm is None:
+                yield (() if (start == 0) else None), iter(())
+                return
+
+            if end is not None:
+                _check_chunk_quotes(mm[start:end], dialect)
+            mm.seek(start)
+            headers = (_read_mmap_record(mm, encoding, dialect) or ()) if (start == 0) else None
+            indices = needle.column_indices(_read_headers(file, encoding, dialect) if (start and needle.columns)
+                                            else headers)
+            yield needle.tag_headers(headers), _iter_rows_containing(mm, needle, dialect, encoding=encoding,
+                                                                     stop=(len(mm) if (end is None) else end),
+                                                                     indices=indices)
+
+    elif end is None:
+        with open_file(file, mode="r", encoding=encoding) as fp:
+            headers = next(csv.reader(fp, dialect=dialect), ())
+            yield needle.tag_headers(headers), _iter_rows_containing(fp, needle, dialect,
+                                                                     indices=needle.column_indices(headers))
+
+    else:
+        with open(file, mode="rb") as fp:
+            fp.seek(start)
+            data = fp.read(end - start)
+        _check_chunk_quotes(data, dialect)
+
+        # translate the newlines like the text-mode files do
+        fp = StringIO(data.decode(encoding), newline=None)
+        del data
+        headers = next(csv.reader(fp, dialect=dialect), ()) if (start == 0) else None
+        indices = needle.column_indices(_read_headers(file, encoding, dialect) if (start and needle.columns)
+                                        else headers)
+        yield needle.tag_headers(headers), _iter_rows_containing(fp, needle, dialect, indices=indices)
+
+
+def get_csv_rows_containing(file, text, ignorecase, encoding, dialect="excel", *, use_mmap=False, regex=False,
+                            columns=None):
     """Searches for CSV rows in the file that contain the given text.
 
+    :argument text
+        The text to find, or a sequence of multiple terms to find in a single pass.
+        For multiple terms, the rows containing any of them are returned, and an extra column
+        (named MATCHED_TERMS_HEADER) is added to the headers and the rows, listing the matched terms.
+
+    :argument use_mmap
+        If True, the raw bytes of the memory-mapped file are searched and only the records around the hits
+        are decoded. Used only for encodings where this is safe (UTF-8, Latin-1, CP1252 etc.),
+        and (with ignorecase) only for ASCII text, as only the ASCII letters are case-folded at bytes level.
+        Undecodable bytes outside of the matching records are not reported in this mode.
+        Not used for compressed files and zip members, which are decompressed while reading (see compressed_file).
+
+    :argument regex
+        If True, the text (or each of the terms) is regular expression searched in the fields.
+        Raw text and raw bytes searches are not used in this mode, so every record is parsed.
+
+    :argument columns
+        Sequence of header names. If passed, only the fields in these columns are checked.
+
+    :argument encoding
+        The encoding of the file, or AUTO_ENCODING ('auto') to detect the encoding and the dialect from
+        a prefix of the file (the passed dialect is used if the dialect could not be detected).
+
     :returns tuple with format: (file, headers, rows) for convenience
     """
 
-    if ignorecase:
-        text = text.lower()
+    needle = text if isinstance(text, _Needle) else _Needle(text, ignorecase, regex=regex, columns=columns)
+    if encoding == AUTO_ENCODING:
+        encoding, dialect = sniff_csv_file(file, dialect)
 
     try:
-        with open(file, mode="r", encoding=encoding) as fp:
-            reader = csv.reader(fp, dialect=dialect)
-            try:
-                headers, rows = next(reader), []
-                for row in reader:
-                    for item in row:
-                        if ignorecase:
-                            if text in item.lower():
-                                rows.append(row)
-                                break
-                        elif text in item:
-                            rows.append(row)
-                            break
-
-            except StopIteration:
-                headers, rows = (), []
+        with _open_csv_rows_containing(file, needle, encoding, dialect, use_mmap) as (headers, rows):
+            rows = list(rows)
     except UnicodeDecodeError:
         _log.exception("Could not read file because of unicode error! File: '%s'", file)
         headers, rows = (), []
-    _log.debug("got %5d CSV rows containing '%s' (ignorecase: %s) in file: '%s'", len(rows), text, ignorecase, file)
+    _log.debug("got %5d CSV rows containing '%s' (ignorecase: %s) in file: '%s'", len(rows), needle, ignorecase, file)
     return file, headers, rows
 
 
-def get_csv_files_containing(files, text, ignorecase, encoding, dialect="excel"):
+def get_dialect_name(dialect) -> str:
+    """Returns printable identifier of the dialect (name, Dialect subclass or instance)."""
+
+    return dialect if isinstance(dialect, str) else getattr(dialect, "__name__", repr(dialect))
+
+
+def _get_split_quotechar(encoding, dialect) -> Optional[bytes]:
+    """Returns the dialect quote char as bytes if files with this encoding/dialect can be split at byte level.
+
+    Splitting requires the newline, quote and delimiter chars to be encoded as single ASCII bytes (UTF-8, Latin-1,
+    CP1252 etc.), and a dialect where the quote chars can be tracked without parsing (no escapechar, quoting enabled,
+    doubled quote chars inside the quoted fields)."""
+
+    dialect = csv.get_dialect(dialect) if isinstance(dialect, str) else dialect
+    if (dialect.quoting == csv.QUOTE_NONE) or dialect.escapechar or (not dialect.quotechar) \
+            or (not dialect.doublequote) or (ord(dialect.delimiter) > 127):
+        return None
+
+    try:
+        if codecs.lookup(encoding).name == "utf-8-sig":
+            encoding = "utf-8"
+        expected = (dialect.quotechar + "\n").encode("ascii")
+        if (dialect.quotechar + "\n").encode(encoding) == expected:
+            return expected[:1]
+    except (LookupError, UnicodeError):
+        pass
+    return None
+
+
+def _count_bytes(file, start, end, sub: bytes) -> int:
+    """Counts the occurrences of sub within the [start, end) byte range of the file."""
+
+    count = 0
+    with open(file, mode="rb") as fp:
+        fp.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = fp.read(min(_READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            count += block.count(sub)
+            remaining -= len(block)
+    return count
+
+
+def _find_record_boundary(fp, offset, quoted, quotechar: bytes) -> int:
+    """Returns the offset right after the first newline at or after offset that is not inside quoted field.
+
+    :argument quoted
+        1 if the offset is inside quoted field, 0 otherwise.
+    """
+
+    fp.seek(offset)
+    pos = offset
+    while True:
+        block = fp.read(_READ_BLOCK_SIZE)
+        if not block:
+            return pos
+
+        i = 0
+        while True:
+            newline = block.find(b"\n", i)
+            if newline == -1:
+                quoted ^= block.count(quotechar, i) & 1
+                break
+
+            quoted ^= block.count(quotechar, i, newline) & 1
+            i = newline + 1
+            if not quoted:
+                return pos + i
+
+        pos += len(block)
+
+
+def _get_chunk_ranges(file, size, chunk_size, quotechar: bytes, quote_counts: Iterable[int]) -> List[tuple]:
+    """Returns the [start, end) byte ranges for splitting the file into chunks that start and end at record boundaries.
+
+    The quote_counts are the counts of the quote char in each raw chunk_size chunk of the file (see _count_bytes),
+    computed in parallel, so the quote-parity at each raw chunk start is known without reading the whole file.
+    Quote chars are expected to appear only around quoted fields (as in RFC 4180), the chunks are checked for that
+    when searched (see _check_chunk_quotes).
+    """
+
+    quote_counts = iter(quote_counts)
+    bounds, quoted = [0], 0
+    with open(file, mode="rb") as fp:
+        for start in range(0, size, chunk_size):
+            if start:
+                boundary = _find_record_boundary(fp, start, quoted, quotechar)
+                if bounds[-1] < boundary < size:
+                    bounds.append(boundary)
+            quoted ^= next(quote_counts) & 1
+    bounds.append(size)
+
+    _log.debug("split CSV file (%s bytes) into [ %s ] chunks: '%s'", size, len(bounds) - 1, file)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _init_search_worker(counter, limit, count_only):
+    """Stores the matching rows counter shared by the workers (None if there's no limit), the limit
+    and the count-only flag in the worker process."""
+
+    global _search_counter, _search_limit, _search_count_only
+    _search_counter, _search_limit, _search_count_only = counter, limit, count_only
+
+
+def _is_limit_reached(counter=None, limit=None) -> bool:
+    """Checks if the search found the max rows already (by default for the search of this worker process)."""
+
+    if counter is None:
+        counter, limit = _search_counter, _search_limit
+    return (counter is not None) and (counter.value >= limit)
+
+
+def _take_rows(rows):
+    """Consumes the lazy matching rows, reserving each of them in the shared counter if the search has a limit.
+
+    :returns list of the rows, or their count in count-only mode (keeping constant memory)
+    """
+
+    if _search_counter is None:
+        return sum(1 for _ in rows) if _search_count_only else list(rows)
+
+    taken = 0 if _search_count_only else []
+    for row in rows:
+        with _search_counter.get_lock():
+            if _search_counter.value >= _search_limit:
+                break
+            _search_counter.value += 1
+        if _search_count_only:
+            taken += 1
+        else:
+            taken.append(row)
+    return taken
+
+
+def _get_csv_chunk_rows_containing(file, start, end, needle: _Needle, encoding, dialect, use_mmap=False):
+    """Searches for CSV rows that contain the needle within the [start, end) byte range of the file.
+
+    The range must start and end at record boundaries. When end is None, the whole file is searched,
+    detecting its encoding and dialect first for AUTO_ENCODING.
+    Nothing is searched if the search limit was reached already (see _init_search_worker).
+
+    :returns tuple with format: (headers, rows, (encoding, dialect))
+        headers is None for chunks that do not start at the beginning of the file,
+        rows is None if the chunk could not be decoded, and the count of the rows in count-only mode.
+    """
+
+    if _is_limit_reached():
+        return (() if (start == 0) else None), _take_rows(()), (encoding, dialect)
+
+    if encoding == AUTO_ENCODING:
+        encoding, dialect = sniff_csv_file(file, dialect)
+
+    try:
+        with _open_csv_rows_containing(file, needle, encoding, dialect, use_mmap, start, end) as result:
+            headers, rows = result[0], _take_rows(result[1])
+    except UnicodeDecodeError:
+        _log.exception("Could not read file chunk [%s:%s] because of unicode error! File: '%s'", start, end, file)
+        return None, None, (encoding, dialect)
+
+    _log.debug("got %5d CSV rows containing '%s' (ignorecase: %s) in chunk [%s:%s] of file: '%s'",
+               rows if _search_count_only else len(rows), needle, needle.ignorecase, start, end, file)
+    return headers, rows, (encoding, dialect)
+
+
+def _get_file_options(file, encoding, dialect, sniff_cache=None) -> tuple:
+    """Returns the (encoding, dialect) for reading the file.
+
+    For AUTO_ENCODING these are the ones in the sniff_cache, or (AUTO_ENCODING, dialect) if the file is not cached,
+    so it's sniffed by the worker that searches it."""
+
+    if (encoding == AUTO_ENCODING) and (sniff_cache is not None):
+        return sniff_cache.get(file, dialect) or (encoding, dialect)
+    return encoding, dialect
+
+
+def _submit_csv_file(scheduler: LptScheduler, file, needle: _Needle, options, chunk_size, use_mmap) -> tuple:
+    """Schedules the search of the file, or the quote counting for splitting it if it's bigger than chunk_size.
+
+    The search is scheduled with the file size, so the biggest files are scanned first.
+    The quote counting is submitted directly to the executor, as the splitting waits for it.
+
+    :returns tuple with format: (options, search_futures, split)
+        split is None, or (size, quotechar, quote_count_futures) for the files that are split,
+        to be searched once their quote counts are known (see _submit_csv_chunks).
+    """
+
+    size = get_file_stat(file).st_size
+    if chunk_size and (size > chunk_size) and not is_compressed(file):
+        if options[0] == AUTO_ENCODING:
+            options = sniff_csv_file(file, options[1])
+        quotechar = _get_split_quotechar(*options)
+        if quotechar is not None:
+            quote_counts = [scheduler.executor.submit(_count_bytes, file, start, min(start + chunk_size, size),
+                                                      quotechar)
+                            for start in range(0, size, chunk_size)]
+            return options, [], (size, quotechar, quote_counts)
+        _log.debug("chunking is not supported for encoding '%s' and dialect %s of file: '%s'", *options, file)
+
+    future = scheduler.submit(size, _get_csv_chunk_rows_containing, file, 0, None, needle, *options, use_mmap)
+    return options, [future], None
+
+
+def _submit_csv_chunks(scheduler: LptScheduler, file, needle: _Needle, options, chunk_size, use_mmap, split) -> list:
+    size, quotechar, quote_counts = split
+    ranges = _get_chunk_ranges(file, size, chunk_size, quotechar, (future.result() for future in quote_counts))
+    return [scheduler.submit(end - start, _get_csv_chunk_rows_containing, file, start, end, needle, *options, use_mmap)
+            for start, end in ranges]
+
+
+def _collect_chunks_results(futures, options, count_only) -> tuple:
+    """Joins the results of the searched chunks of a file, in their order.
+
+    :returns tuple (headers, rows, options), the rows being their count in count-only mode
+    """
+
+    headers, rows = (), (0 if count_only else [])
+    for future in futures:
+        chunk_headers, chunk_rows, options = future.result()
+        if chunk_rows is None:
+            return (), (0 if count_only else []), options
+        if chunk_headers is not None:
+            headers = chunk_headers
+        rows += chunk_rows
+    return headers, rows, options
+
+
+def _search_csv_files(files, needle: _Needle, encoding, dialect, chunk_size, use_mmap, sniff_cache=None, *,
+                      count_only=False, limit=None) -> list:
+    """Returns (file, headers, rows) for each of the given files, including the files without matching rows.
+
+    Each file is scheduled as soon as it's taken from the files iterable, so with lazy iterable
+    (e.g. iter_csv_files) the workers start scanning while the rest of the files are still being discovered.
+    The chunks of the files that are split are scheduled after the discovery, when their quote counts are ready,
+    all of them before collecting any results (so a big file does not wait for the results of the previous files).
+
+    The pending files and chunks are dispatched to the free workers largest-first (see LptScheduler),
+    so a big file found last does not keep one worker busy long after the rest are done.
+    The utilization of the workers is logged (as INFO) when the search is done.
+
+    With count_only, the rows are only counted in the workers, and the result has their count instead.
+    With limit, the workers stop once that many rows were found in total, and the discovery stops as well.
+    """
+
+    tasks = []
+    workers = os.cpu_count() or 1
+    counter = multiprocessing.Value("q", 0) if (limit is not None) else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker,
+                             initargs=(counter, limit, count_only)) as pool:
+        scheduler = LptScheduler(pool, max_in_flight=workers)
+        for file in files:
+            if _is_limit_reached(counter, limit):
+                _log.debug("found max rows (%s), stopped looking for more files", limit)
+                break
+            options = _get_file_options(file, encoding, dialect, sniff_cache)
+            submitted = _submit_csv_file(scheduler, file, needle, options, chunk_size, use_mmap)
+            tasks.append((file, options[0] == AUTO_ENCODING) + submitted)
+        _log.debug("submitted [ %s ] CSV files for searching", len(tasks))
+
+        # all chunks are scheduled before collecting any results, so they are dispatched largest-first with the files
+        for idx, (file, sniffed, options, futures, split) in enumerate(tasks):
+            if split and not _is_limit_reached(counter, limit):
+                futures = _submit_csv_chunks(scheduler, file, needle, options, chunk_size, use_mmap, split)
+                tasks[idx] = (file, sniffed, options, futures, split)
+
+        results = []
+        for file, sniffed, options, futures, split in tasks:
+            try:
+                headers, rows, options = _collect_chunks_results(futures, options, count_only)
+            except _MisalignedChunkError:
+                _log.warning("found quote char outside of quoted field, searching the file as a whole: '%s'", file)
+                future = scheduler.submit(split[0], _get_csv_chunk_rows_containing, file, 0, None, needle, *options,
+                                          use_mmap)
+                headers, rows, options = _collect_chunks_results([future], options, count_only)
+
+            if sniffed and (sniff_cache is not None) and (options[0] != AUTO_ENCODING):
+                sniff_cache.put(file, dialect, *options)
+            results.append((file, headers, rows))
+        scheduler.log_usage(workers)
+
+    if sniff_cache is not None:
+        sniff_cache.save()
+    return results
+
+
+def get_csv_files_containing(files,
+                             text,
+                             ignorecase,
+                             encoding,
+                             dialect="excel",
+                             *,
+                             chunk_size=DEFAULT_CHUNK_SIZE,
+                             use_mmap=False,
+                             cache=None,
+                             regex=False,
+                             columns=None,
+                             sniff_cache=None,
+                             limit=None):
     """Checks the given files for CSV rows having the text, and returns all matching contents.
 
-    The result has format [(file,headers,rows), (file2,headers2,rows2), ...] for convenience."""
+    Files bigger than chunk_size bytes are split at record boundaries and their chunks are scanned in parallel,
+    then the matching rows are reassembled in their original order.
+    Pass chunk_size=None to scan each file as a single task.
+
+    The files can be lazy iterable (e.g. iter_csv_files), the scanning of the first files starts
+    while the rest are still being discovered.
+
+    With use_mmap=True the files are memory-mapped and searched as raw bytes (see get_csv_rows_containing).
 
-    args_len = len(files)
-    text_args = args_len * (text,)
-    ignorecase_args = args_len * (ignorecase,)
-    encoding_args = args_len * (encoding,)
-    dialect_args = args_len * (dialect,)
+    The text can be a sequence of multiple terms, searched in a single pass (see get_csv_rows_containing).
+    It's searched as regular expression with regex=True, only in the given columns (header names) if passed.
 
-    def on_result(r):
-        print(r.result())
+    If cache (CsvResultCache) is passed, only the files that were changed since their last search are scanned.
 
-    with ProcessPoolExecutor() as pool:
+    With encoding AUTO_ENCODING ('auto') the encoding and the dialect are detected for each file
+    (see get_csv_rows_containing), the detected ones are reused for the unchanged files if sniff_cache
+    (CsvSniffCache) is passed.
+
+    If limit is passed, the search stops once that many matching rows were found (in total, by any of the workers),
+    so which of the matching rows are returned is not deterministic. The cache is not used with limit.
+
+    The result has format [(file,headers,rows), (file2,headers2,rows2), ...] for convenience."""
+
+    needle = _Needle(text, ignorecase, regex=regex, columns=columns)
+    if (cache is None) or (limit is not None):
         return [(file, headers, rows)
                 for file, headers, rows
-                in pool.map(get_csv_rows_containing, files, text_args, ignorecase_args, encoding_args, dialect_args)
+                in _search_csv_files(files, needle, encoding, dialect, chunk_size, use_mmap, sniff_cache, limit=limit)
                 if rows]
+
+    cached, missing = {}, []
+
+    def iter_missing():
+        for file in files:
+            cached[file] = cache.get(file, needle.terms, ignorecase, encoding, dialect, regex=regex, columns=columns)
+            if cached[file] is None:
+                missing.append(file)
+                yield file
+
+    for file, headers, rows in _search_csv_files(iter_missing(), needle, encoding, dialect, chunk_size, use_mmap,
+                                                 sniff_cache):
+        cache.put(file, needle.terms, ignorecase, encoding, dialect, headers, rows, regex=regex, columns=columns)
+        cached[file] = (headers, rows)
+    cache.evict()
+    _log.debug("found cached results for [ %s ] of [ %s ] CSV files", len(cached) - len(missing), len(cached))
+
+    return [(file, headers, rows)
+            for file, (headers, rows) in cached.items()
+            if rows]
+
+
+def count_csv_files_containing(files,
+                               text,
+                               ignorecase,
+                               encoding,
+                               dialect="excel",
+                               *,
+                               chunk_size=DEFAULT_CHUNK_SIZE,
+                               use_mmap=False,
+                               regex=False,
+                               columns=None,
+                               sniff_cache=None,
+                               limit=None) -> List[tuple]:
+    """Counts the CSV rows having the text in each of the files, without keeping the rows in memory.
+
+    Takes the same arguments as get_csv_files_containing, with limit the counting stops once that many matching
+    rows were found in total.
+
+    The result has format [(file, count), (file2, count2), ...] for the files with matching rows.
+    """
+
+    needle = _Needle(text, ignorecase, regex=regex, columns=columns)
+    return [(file, count)
+            for file, _, count
+            in _search_csv_files(files, needle, encoding, dialect, chunk_size, use_mmap, sniff_cache,
+                                 count_only=True, limit=limit)
+            if count]
+
+
+def _init_stream_worker(queue, cancelled):
+    """Stores the shared results queue and cancellation event in the worker process."""
+
+    global _stream_queue, _stream_cancelled
+    _stream_queue, _stream_cancelled = queue, cancelled
+
+
+def _stream_csv_rows_containing(file, needle: _Needle, encoding, dialect, batch_size, use_mmap) -> tuple:
+    """Pushes the matching rows of a single file into the shared queue, in batches of up to batch_size rows.
+
+    A (file, None, None) marker is put when the file is done.
+
+    :returns the (encoding, dialect) used for reading the file, detected for AUTO_ENCODING
+    """
+
+    if encoding == AUTO_ENCODING:
+        encoding, dialect = sniff_csv_file(file, dialect)
+
+    count = 0
+    try:
+        with _open_csv_rows_containing(file, needle, encoding, dialect, use_mmap) as (headers, rows):
+            for batch in chunked(rows, batch_size):
+                if _stream_cancelled.is_set():
+                    break
+                _stream_queue.put((file, headers, batch))
+                count += len(batch)
+    except UnicodeDecodeError:
+        _log.exception("Could not read file because of unicode error! File: '%s'", file)
+    _log.debug("streamed %5d CSV rows containing '%s' (ignorecase: %s) in file: '%s'",
+               count, needle, needle.ignorecase, file)
+    _stream_queue.put((file, None, None))
+    return encoding, dialect
+
+
+def _iter_ready_items(queue) -> Iterator[tuple]:
+    """Yields the items that are already in the queue, without waiting for more."""
+
+    while True:
+        try:
+            yield queue.get_nowait()
+        except Empty:
+            return
+
+
+def _raise_for_failed(futures):
+    """Re-raises the first exception raised by a worker task (if any)."""
+
+    for future in futures:
+        if future.done() and (not future.cancelled()) and future.exception():
+            raise future.exception()
+
+
+def iter_csv_files_containing(files,
+                              text,
+                              ignorecase,
+                              encoding,
+                              dialect="excel",
+                              *,
+                              max_rows_in_flight=10000,
+                              batch_size=500,
+                              use_mmap=False,
+                              regex=False,
+                              columns=None,
+                              sniff_cache=None) -> Generator[tuple, None, None]:
+    """Streaming version of get_csv_files_containing with bounded memory usage.
+
+    The matching rows flow from the worker processes through a bounded queue and are yielded as soon as they arrive,
+    in batches with format (file, headers, rows). Batches of different files may interleave, but the batches of
+    each file come in their original order.
+
+    The text can be a sequence of multiple terms, searched in a single pass (see get_csv_rows_containing).
+    It's searched as regular expression with regex=True, only in the given columns (header names) if passed.
+
+    :argument max_rows_in_flight
+        Upper limit for the rows produced by the workers, but not yet consumed by the caller.
+        Workers block when the limit is reached.
+
+    :argument batch_size
+        Max number of rows sent by a worker at once (capped by max_rows_in_flight).
+
+    :argument use_mmap
+        If True the files are memory-mapped and searched as raw bytes (see get_csv_rows_containing).
+
+    :argument sniff_cache
+        CsvSniffCache for reusing the detected encoding and dialect of the files, with encoding AUTO_ENCODING.
+
+    The files can be lazy iterable (e.g. iter_csv_files), each file is submitted as soon as it's discovered,
+    and the batches that are ready are yielded while the files are still discovered.
+    """
+
+    needle = _Needle(text, ignorecase, regex=regex, columns=columns)
+    batch_size = max(1, min(batch_size, max_rows_in_flight))
+    queue = multiprocessing.Queue(maxsize=max(1, max_rows_in_flight // batch_size))
+    cancelled = multiprocessing.Event()
+    _log.debug("streaming CSV rows containing '%s' (max rows in flight: %s, batch size: %s)",
+               needle, max_rows_in_flight, batch_size)
+
+    with ProcessPoolExecutor(initializer=_init_stream_worker, initargs=(queue, cancelled)) as pool:
+        sniffed, futures = [], []
+        finished = 0
+        try:
+            for file in files:
+                options = _get_file_options(file, encoding, dialect, sniff_cache)
+                futures.append(pool.submit(_stream_csv_rows_containing, file, needle, *options, batch_size, use_mmap))
+                if options[0] == AUTO_ENCODING:
+                    sniffed.append((file, futures[-1]))
+
+                # take the ready batches between the submits, so the workers don't block on full queue
+                for ready_file, headers, rows in _iter_ready_items(queue):
+                    if rows is None:
+                        finished += 1
+                    else:
+                        yield ready_file, headers, rows
+
+            while finished < len(futures):
+                try:
+                    file, headers, rows = queue.get(timeout=0.5)
+                except Empty:
+                    _raise_for_failed(futures)
+                    continue
+
+                if rows is None:
+                    finished += 1
+                else:
+                    yield file, headers, rows
+
+            _raise_for_failed(futures)
+            if sniff_cache is not None:
+                for file, future in sniffed:
+                    sniff_cache.put(file, dialect, *future.result())
+                sniff_cache.save()
+        finally:
+            # unblock the workers if the consumer stopped early, so the pool can shut down
+            cancelled.set()
+            for future in futures:
+                future.cancel()
+            while not all(future.done() for future in futures):
+                try:
+                    queue.get(timeout=0.1)
+                except Empty:
+                    pass
@@ -0,0 +1,227 @@
+"""Persistent full-text index of CSV files, for answering repeated searches without re-scanning the files.
+
+The rows are stored in SQLite FTS5 table with trigram tokenizer (requires SQLite 3.34+),
+which allows finding the candidate rows for substring searches without reading the CSV files.
+"""
+import csv
+import json
+import logging
+import sqlite3
+from itertools import groupby, islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+from more_itertools import chunked
+
+from hed_utils.support.file_utils.compressed_file import get_file_stat, open_file
+from hed_utils.support.file_utils.csv_file import _Needle, get_dialect_name
+from hed_utils.support.file_utils.csv_sniff import AUTO_ENCODING, sniff_csv_file
+
+_log = logging.getLogger(__name__)
+_log.addHandler(logging.NullHandler())
+
+_FIELDS_SEPARATOR = "\x1f"  # joins the fields of the indexed rows, so the terms don't match across fields
+
+_INSERT_BATCH_SIZE = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    first_rowid INTEGER,
+    last_rowid INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS rows USING fts5(content, file_id UNINDEXED, fields UNINDEXED, tokenize='trigram');
+"""
+
+
+def _get_options(encoding, dialect) -> str:
+    """Returns the read options of the indexed files, reindexing is needed when they change."""
+
+    return json.dumps([encoding, get_dialect_name(dialect)])
+
+
+def _quote_term(term: str) -> str:
+    """Formats the term as FTS5 phrase (substring search for the trigram tokenizer)."""
+
+    return '"' + term.replace('"', '""') + '"'
+
+
+class CsvIndex:
+    """On-disk index of the rows in multiple CSV files, updated incrementally based on file size and mtime.
+
+    Usage:
+
+        with CsvIndex("exports_index.sqlite") as index:
+            index.update(get_csv_files(folder), encoding="utf-8")
+            results = index.search("text", ignorecase=True)
+    """
+
+    def __init__(self, file: Union[str, Path]):
+        self.file = str(Path(file).absolute())
+        _log.debug("opening CSV index at: '%s'", self.file)
+        self._connection = sqlite3.connect(self.file)
+        try:
+            self._connection.executescript(_SCHEMA)
+        except sqlite3.OperationalError:
+            self._connection.close()
+            raise
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _delete_file(self, file_id, first_rowid, last_rowid):
+        if first_rowid is not None:
+            self._connection.execute("DELETE FROM rows WHERE rowid BETWEEN ? AND ?", (first_rowid, last_rowid))
+        self._connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _index_file(self, file: str, size, mtime_ns, options, encoding, dialect):
+        db = self._connection
+        if encoding == AUTO_ENCODING:
+            encoding, dialect = sniff_csv_file(file, dialect)
+        with open_file(file, mode="r", encoding=encoding) as fp:
+            reader = csv.reader(fp, dialect=dialect)
+            headers = next(reader, [])
+            cursor = db.execute("INSERT INTO files (path, size, mtime_ns, options, headers) VALUES (?, ?, ?, ?, ?)",
+                                (file, size, mtime_ns, options, json.dumps(headers, ensure_ascii=False)))
+            file_id = cursor.lastrowid
+            first_rowid = (db.execute("SELECT max(rowid) FROM rows").fetchone()[0] or 0) + 1
+
+            for batch in chunked(reader, _INSERT_BATCH_SIZE):
+                db.executemany("INSERT INTO rows (content, file_id, fields) VALUES (?, ?, ?)",
+                               [(_FIELDS_SEPARATOR.join(row), file_id, json.dumps(row, ensure_ascii=False))
+                                for row in batch])
+
+            last_rowid = db.execute("SELECT max(rowid) FROM rows").fetchone()[0] or 0
+            if last_rowid >= first_rowid:
+                db.execute("UPDATE files SET first_rowid = ?, last_rowid = ? WHERE id = ?",
+                           (first_rowid, last_rowid, file_id))
+
+    def update(self, files: Iterable[str], encoding="utf-8", dialect="excel", *, prune=True) -> Tuple[int, int]:
+        """Brings the index up to date with the given files.
+
+        New files, and files with changed size/mtime (or read options) are (re)indexed, the rest are skipped.
+        With encoding AUTO_ENCODING ('auto') the encoding and the dialect are detected for each indexed file.
+
+        :argument prune
+            If True, removes from the index the files that are not in the given ones.
+
+        :returns tuple (indexed_files_count, removed_files_count)
+        """
+
+        db = self._connection
+        options = _get_options(encoding, dialect)
+        indexed = {path: (file_id, size, mtime_ns, file_options, first_rowid, last_rowid)
+                   for file_id, path, size, mtime_ns, file_options, first_rowid, last_rowid
+                   in db.execute("SELECT id, path, size, mtime_ns, options, first_rowid, last_rowid FROM files")}
+
+        files = [str(Path(file).absolute()) for file in files]
+        indexed_count = removed_count = 0
+        with db:
+            for file in files:
+                file_stat = get_file_stat(file)
+                entry = indexed.get(file)
+                if entry:
+                    file_id, size, mtime_ns, file_options, first_rowid, last_rowid = entry
+                    if (size, mtime_ns, file_options) == (file_stat.st_size, file_stat.st_mtime_ns, options):
+                        continue
+                    self._delete_file(file_id, first_rowid, last_rowid)
+
+                _log.debug("indexing CSV file: '%s'", file)
+                db.execute("SAVEPOINT index_file")  # the rows of the file are inserted in batches while reading it
+                try:
+                    self._index_file(file, file_stat.st_size, file_stat.st_mtime_ns, options, encoding, dialect)
+                    indexed_count += 1
+                except UnicodeDecodeError:
+                    _log.exception("Could not index file because of unicode error! File: '%s'", file)
+                    db.execute("ROLLBACK TO index_file")
+                finally:
+                    db.execute("RELEASE index_file")
+
+            if prune:
+                for file in set(indexed).difference(files):
+                    file_id, _, _, _, first_rowid, last_rowid = indexed[file]
+                    _log.debug("removing missing CSV file from the index: '%s'", file)
+                    self._delete_file(file_id, first_rowid, last_rowid)
+                    removed_count += 1
+
+        _log.debug("updated CSV index: indexed [ %s ] files, removed [ %s ] files (of [ %s ] given files)",
+                   indexed_count, removed_count, len(files))
+        return indexed_count, removed_count
+
+    def search(self, text, ignorecase, *, regex=False, columns=None) -> List[tuple]:
+        """Finds the indexed CSV rows that contain the text (or any of multiple terms, see get_csv_rows_containing).
+
+        Only the candidate rows found by the index are checked. Texts shorter than 3 chars and regular expressions
+        (regex=True) can't be looked up with trigrams, so all indexed rows are checked for them
+        (still without reading the CSV files).
+
+        If columns (header names) are passed, only the fields in these columns are checked.
+
+        The result has format [(file,headers,rows), (file2,headers2,rows2), ...] like get_csv_files_containing.
+        """
+
+        needle = _Needle(text, ignorecase, regex=regex, columns=columns)
+        results = []
+        for path, headers, rows in self._iter_candidates(needle):
+            rows = list(needle.filter_rows(rows, needle.column_indices(headers)))
+            if rows:
+                results.append((path, needle.tag_headers(headers), rows))
+
+        _log.debug("found %s CSV rows containing '%s' (ignorecase: %s) in the index",
+                   sum(len(rows) for _, _, rows in results), needle, ignorecase)
+        return results
+
+    def count(self, text, ignorecase, *, regex=False, columns=None, limit=None) -> List[tuple]:
+        """Counts the indexed CSV rows that contain the text in each of the files, without keeping the rows in memory.
+
+        Takes the same arguments as search, with limit the counting stops once that many matching rows were found
+        in total.
+
+        The result has format [(file, count), (file2, count2), ...] like count_csv_files_containing.
+        """
+
+        needle = _Needle(text, ignorecase, regex=regex, columns=columns)
+        counts = []
+        total = 0
+        for path, headers, rows in self._iter_candidates(needle):
+            if (limit is not None) and (total >= limit):
+                break
+            matching = needle.filter_rows(rows, needle.column_indices(headers))
+            count = sum(1 for _ in (matching if (limit is None) else islice(matching, limit - total)))
+            if count:
+                counts.append((path, count))
+                total += count
+
+        _log.debug("counted %s CSV rows containing '%s' (ignorecase: %s) in the index", total, needle, ignorecase)
+        return counts
+
+    def _iter_candidates(self, needle: _Needle):
+        """Yields (path, headers, rows) for the files with candidate rows, the rows are lazily read from the index."""
+
+        db = self._connection
+        if (not needle.regex) and all(len(term) >= 3 for term in needle.terms):
+            query = " OR ".join(_quote_term(term) for term in needle.terms)
+            cursor = db.execute("SELECT file_id, fields FROM rows WHERE rows MATCH ? ORDER BY rowid", (query,))
+        else:
+            if not needle.regex:
+                _log.warning("can't lookup texts shorter than 3 chars in the index, checking all indexed rows...")
+            cursor = db.execute("SELECT file_id, fields FROM rows ORDER BY rowid")
+
+        files = {file_id: (path, json.loads(headers))
+                 for file_id, path, headers in db.execute("SELECT id, path, headers FROM files")}
+        # the rows of each file have consecutive rowids, so the candidates are grouped by file
+        for file_id, candidates in groupby(cursor, key=itemgetter(0)):
+            path, headers = files[file_id]
+            yield path, headers, (json.loads(fields) for _, fields in candidates)
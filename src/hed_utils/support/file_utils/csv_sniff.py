@@ -0,0 +1,140 @@
+"""Detection of the encoding and the dialect of CSV files, from a bounded prefix of their contents."""
+import codecs
+import csv
+import json
+import logging
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from appdirs import user_cache_dir
+from bs4.dammit import UnicodeDammit
+
+from hed_utils.support.file_utils.compressed_file import get_file_stat, open_file
+
+_log = logging.getLogger(__name__)
+_log.addHandler(logging.NullHandler())
+
+AUTO_ENCODING = "auto"  # pass as encoding to detect the encoding and the dialect of each file
+
+DEFAULT_SNIFF_CACHE_FILE = Path(user_cache_dir("hed_utils")).joinpath("csv_sniff.json")
+
+_SAMPLE_SIZE = 64 * 1024  # bytes read for detecting the encoding
+_DIALECT_SAMPLE_SIZE = 8 * 1024  # chars used for detecting the dialect (csv.Sniffer is slow on big samples)
+_DELIMITERS = ",;\t|"
+
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"),
+         (codecs.BOM_UTF32_LE, "utf-32"),
+         (codecs.BOM_UTF32_BE, "utf-32"),
+         (codecs.BOM_UTF16_LE, "utf-16"),
+         (codecs.BOM_UTF16_BE, "utf-16"))
+
+_DIALECT_ATTRIBUTES = ("delimiter", "quotechar", "doublequote", "escapechar", "skipinitialspace")
+
+
+class SniffedDialect(csv.Dialect):
+    """Dialect detected by csv.Sniffer, that (unlike the sniffed dialect classes) can be sent to worker processes."""
+
+    delimiter = ","
+    quotechar = "\""
+    doublequote = True
+    escapechar = None
+    skipinitialspace = False
+    lineterminator = "\r\n"
+    quoting = csv.QUOTE_MINIMAL
+
+    def __init__(self, **attributes):
+        for name, value in attributes.items():
+            setattr(self, name, value)
+        super().__init__()
+
+    def __repr__(self):
+        attributes = ", ".join(f"{name}={getattr(self, name)!r}" for name in _DIALECT_ATTRIBUTES)
+        return f"{type(self).__name__}({attributes})"
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in _DIALECT_ATTRIBUTES}
+
+
+def _detect_encoding(sample: bytes, truncated: bool) -> str:
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        sample.decode("utf-8")
+        return "utf-8"  # also for ASCII prefix, as non-ASCII chars may follow
+    except UnicodeDecodeError as e:
+        if truncated and (e.start >= len(sample) - 3):
+            return "utf-8"  # the sample ends in the middle of a char
+
+    return UnicodeDammit(sample, is_html=False).original_encoding or "utf-8"
+
+
+def _detect_dialect(text: str, fallback_dialect):
+    text = text[:_DIALECT_SAMPLE_SIZE]
+    last_newline = text.rfind("\n")
+    if last_newline > 0:
+        text = text[:last_newline + 1]
+
+    try:
+        sniffed = csv.Sniffer().sniff(text, delimiters=_DELIMITERS)
+    except csv.Error:
+        return fallback_dialect
+    return SniffedDialect(**{name: getattr(sniffed, name) for name in _DIALECT_ATTRIBUTES})
+
+
+def sniff_csv_file(file: Union[str, Path], fallback_dialect="excel") -> Tuple[str, Union[str, csv.Dialect]]:
+    """Detects the encoding and the dialect of the CSV file from a bounded prefix of it.
+
+    :returns tuple (encoding, dialect), with the fallback_dialect if the dialect could not be detected
+    """
+
+    with open_file(file, mode="rb") as fp:
+        sample = fp.read(_SAMPLE_SIZE)
+
+    encoding = _detect_encoding(sample, truncated=(len(sample) == _SAMPLE_SIZE))
+    text = sample.decode(encoding, errors="ignore")
+    dialect = _detect_dialect(text, fallback_dialect)
+    _log.debug("sniffed encoding '%s' and dialect %s for CSV file: '%s'", encoding, dialect, file)
+    return encoding, dialect
+
+
+class CsvSniffCache:
+    """Persistent cache of the sniffed (encoding, dialect) of CSV files, keyed on the file fingerprint."""
+
+    def __init__(self, file: Union[str, Path] = DEFAULT_SNIFF_CACHE_FILE):
+        self.file = Path(file).absolute()
+        try:
+            self._entries = json.loads(self.file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._entries = {}
+        self._changed = False
+
+    @staticmethod
+    def _get_key(file, fallback_dialect) -> str:
+        file_stat = get_file_stat(file)
+        fallback_name = fallback_dialect if isinstance(fallback_dialect, str) else repr(fallback_dialect)
+        return json.dumps([str(Path(file).absolute()), file_stat.st_size, file_stat.st_mtime_ns, fallback_name])
+
+    def get(self, file, fallback_dialect="excel") -> Optional[tuple]:
+        entry = self._entries.get(self._get_key(file, fallback_dialect))
+        if entry is None:
+            return None
+
+        encoding, dialect = entry
+        return encoding, (SniffedDialect(**dialect) if dialect else fallback_dialect)
+
+    def put(self, file, fallback_dialect, encoding, dialect):
+        self._entries[self._get_key(file, fallback_dialect)] = [
+            encoding, dialect.to_dict() if isinstance(dialect, SniffedDialect) else None
+        ]
+        self._changed = True
+
+    def save(self):
+        if not self._changed:
+            return
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(self._entries), encoding="utf-8")
+        tmp_file.replace(self.file)
+        self._changed = False
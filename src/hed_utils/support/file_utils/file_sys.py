@@ -1,7 +1,11 @@
+import fnmatch
 import logging
+import os
+import re
 import shutil
 import tempfile
 from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from functools import partial
 from multiprocessing import Process
@@ -9,12 +13,15 @@ from os import walk
 from pathlib import Path
 from pprint import pformat
 from subprocess import call
-from typing import Generator, Union
+from typing import Generator, Iterable, List, Optional, Union
 
 from hed_utils.support import os_type
 
 Contents = namedtuple("Contents", "dirpath dirnames filenames")
 
+# like Contents, but with lists of os.DirEntry (having cached type and stat info) instead of names
+ScanContents = namedtuple("ScanContents", "dirpath dirs files")
+
 _log = logging.getLogger(__name__)
 _log.addHandler(logging.NullHandler())
 
@@ -54,8 +61,124 @@ def walk_contents(folder: Union[str, Path], followlinks=False) -> Generator[Cont
         yield Contents(dirpath, dirnames, filenames)
 
 
+def _compile_name_patterns(patterns: Optional[Iterable[str]]):
+    """Compiles the glob patterns (e.g. '*.csv', 'data_??.txt') to single case-insensitive name matcher."""
+
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns), re.IGNORECASE).match
+
+
+def _scan_dir(dirpath: str, depth: int):
+    """Lists the directory contents with a single scandir call, the entry types are cached by os.DirEntry."""
+
+    dirs, files = [], []
+    try:
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                (dirs if is_dir else files).append(entry)
+    except OSError as e:
+        _log.warning("could not scan dir '%s': %s", dirpath, e)
+    return ScanContents(dirpath, dirs, files), depth
+
+
+def scan_contents(folder: Union[str, Path],
+                  *,
+                  max_depth: Optional[int] = None,
+                  exclude_dirs: Optional[Iterable[str]] = None,
+                  followlinks=False,
+                  workers: Optional[int] = None) -> Generator[ScanContents, None, None]:
+    """Recursively scans the folder with os.scandir, yielding ScanContents tuples (one per directory).
+
+    Unlike walk_contents no Path objects are created, and the os.DirEntry items keep the type (and on Windows
+    the stat) info from the directory listing, so no extra system calls are made for them.
+
+    :argument max_depth
+        How deep to descend in the sub-directories, 0 scans only the folder itself (default: no limit).
+
+    :argument exclude_dirs
+        Names (or glob patterns, e.g. '.*') of the directories to skip, they are also removed from the results.
+
+    :argument workers
+        If passed, the directories are listed in parallel by that many threads, which pays off mostly
+        on network filesystems with high latency. The directories are then yielded in completion order,
+        otherwise they are yielded top-down (parents before their sub-directories).
+    """
+
+    folder = os.path.abspath(folder)
+    is_excluded = _compile_name_patterns(exclude_dirs)
+    _log.debug("scanning folder contents of: %s", folder)
+
+    def get_subdirs(contents: ScanContents, depth: int) -> List[str]:
+        if is_excluded:
+            contents.dirs[:] = [entry for entry in contents.dirs if not is_excluded(entry.name)]
+        if (max_depth is not None) and (depth >= max_depth):
+            return []
+        return [entry.path for entry in contents.dirs if followlinks or not entry.is_symlink()]
+
+    if not workers:
+        stack = [(folder, 0)]
+        while stack:
+            contents, depth = _scan_dir(*stack.pop())
+            stack.extend((dirpath, depth + 1) for dirpath in reversed(get_subdirs(contents, depth)))
+            yield contents
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, folder, 0)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    contents, depth = future.result()
+                    pending.update(pool.submit(_scan_dir, dirpath, depth + 1)
+                                   for dirpath in get_subdirs(contents, depth))
+                    yield contents
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def scan_files(folder: Union[str, Path],
+               *,
+               suffixes: Optional[Iterable[str]] = None,
+               patterns: Optional[Iterable[str]] = None,
+               max_depth: Optional[int] = None,
+               exclude_dirs: Optional[Iterable[str]] = None,
+               followlinks=False,
+               workers: Optional[int] = None) -> Generator[os.DirEntry, None, None]:
+    """Recursively scans the folder (see scan_contents), yielding os.DirEntry for each of the files.
+
+    Use entry.path for the file path, and entry.stat() for its (cached) stat info.
+
+    :argument suffixes
+        If passed, only files with names ending with any of the suffixes are yielded (case insensitive).
+
+    :argument patterns
+        If passed, only files with names matching any of the glob patterns are yielded (case insensitive).
+    """
+
+    suffixes = tuple(suffix.lower() for suffix in suffixes) if suffixes else None
+    is_matching = _compile_name_patterns(patterns)
+
+    for contents in scan_contents(folder, max_depth=max_depth, exclude_dirs=exclude_dirs,
+                                  followlinks=followlinks, workers=workers):
+        for entry in contents.files:
+            if suffixes and not entry.name.lower().endswith(suffixes):
+                continue
+            if is_matching and not is_matching(entry.name):
+                continue
+            yield entry
+
+
 def walk_files(folder: Union[str, Path]) -> Generator[Path, None, None]:
-    """Recursively (bottom-up) walks the given folder's contents, yielding only file-paths."""
+    """Recursively (bottom-up) walks the given folder's contents, yielding only file-paths.
+
+    See scan_files for faster discovery of big trees."""
 
     for contents in walk_contents(folder):
         for filename in contents.filenames:
@@ -114,28 +237,39 @@ def delete_folder(folder: Union[str, Path], *, inclusive=True) -> bool:
         obj(bool):          True if all targets were deleted, False otherwise.
     """
 
-    def delete_dir(_dirpath: Path):
-        if _dirpath.exists():
-            try:
-                _dirpath.rmdir()
-            except FileNotFoundError:
-                pass
-
-            return not _dirpath.exists()
+    def delete(path: str, remove) -> bool:
+        try:
+            remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _log.debug("failed to delete '%s': %s", path, e)
+            return False
+        return True
 
-    folder = Path(folder).absolute()
-    _log.debug("deleting folder at: '%s'", str(folder))
+    folder = os.path.abspath(folder)
+    _log.debug("deleting folder at: '%s'", folder)
 
     failed_deletions = list()
-
-    # delete all files
-    failed_deletions.extend(filepath for filepath in walk_files(folder) if not delete_file(filepath))
-
-    # delete all folders
-    failed_deletions.extend(dirpath for dirpath in walk_dirs(folder) if not delete_dir(dirpath))
+    dirpaths = list()
+
+    # delete all files (and the links to folders, which are not followed)
+    for contents in scan_contents(folder):
+        for entry in contents.files:
+            if not delete(entry.path, os.unlink):
+                failed_deletions.append(entry.path)
+        for entry in contents.dirs:
+            if entry.is_symlink():
+                if not delete(entry.path, os.unlink):
+                    failed_deletions.append(entry.path)
+            else:
+                dirpaths.append(entry.path)
+
+    # delete all folders, the scan yields the parents before their sub-folders
+    failed_deletions.extend(dirpath for dirpath in reversed(dirpaths) if not delete(dirpath, os.rmdir))
 
     # delete the root if needed
-    if inclusive and not delete_dir(folder):
+    if inclusive and os.path.isdir(folder) and not delete(folder, os.rmdir):
         failed_deletions.append(folder)
 
     if failed_deletions:
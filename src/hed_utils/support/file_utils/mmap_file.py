@@ -0,0 +1,55 @@
+"""Helpers for scanning files through memory-mapping, without decoding their whole contents."""
+import codecs
+import logging
+import mmap
+from contextlib import contextmanager
+from os.path import getsize
+from pathlib import Path
+from typing import Optional, Union
+
+_log = logging.getLogger(__name__)
+_log.addHandler(logging.NullHandler())
+
+_ASCII_CHARS = bytes(range(128))
+
+
+def mmap_safe_encoding(encoding: str) -> Optional[str]:
+    """Returns the encoding to use for encoding search needles, if the text can be searched as raw bytes.
+
+    That is the case when every encoded char is a unique byte sequence that can't be found inside another char,
+    and the ASCII chars are encoded as themselves - UTF-8 and the single-byte encodings like Latin-1 or CP1252.
+
+    :returns
+        The encoding to use for the needles ('utf-8' for 'utf-8-sig'), or None if the encoding is not safe.
+    """
+
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return None
+
+    if name in ("utf-8", "utf-8-sig"):
+        return "utf-8"
+
+    try:
+        is_ascii_compatible = _ASCII_CHARS.decode(name) == _ASCII_CHARS.decode("ascii")
+        is_single_byte = len(bytes(range(256)).decode(name, errors="replace")) == 256
+    except (UnicodeError, TypeError, ValueError):
+        return None
+    return name if (is_ascii_compatible and is_single_byte) else None
+
+
+@contextmanager
+def open_mmap(file: Union[str, Path]):
+    """Context manager that maps the file contents in read-only mode.
+
+    Yields None for empty files, as they can't be mapped.
+    """
+
+    if not getsize(file):
+        yield None
+        return
+
+    with open(file, mode="rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
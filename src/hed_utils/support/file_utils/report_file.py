@@ -0,0 +1,271 @@
+"""Report writers for sheets data in machine-readable formats, that are faster to write and to load than .xlsx.
+
+All writers share the interface of XlsxStreamWriter: append(title, headers, rows) any number of times, then close().
+The rows are written (or buffered in bounded batches) as they are appended.
+
+The sheets are written as a single table with the sheet title in the first column ('sheet' by default).
+Sheets with other headers than the first sheet go to separate tables, next to the first one:
+'report.csv', 'report_2.csv', ... (see get_files)
+
+The writers are picked by the file extension from REPORT_WRITERS, which can be extended with custom writers.
+Parquet and Feather files are written with pyarrow (`pip install hed_utils[parquet]`).
+"""
+import csv
+import json
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, List
+
+from hed_utils.support.file_utils.xlsx_file import XlsxStreamWriter
+
+_log = logging.getLogger(__name__)
+_log.addHandler(logging.NullHandler())
+
+_ARROW_BATCH_ROWS = 65536  # rows buffered per table before writing them as record batch (row group)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Writing Parquet and Feather reports requires pyarrow "
+                          "(pip install hed_utils[parquet])!") from e
+    return pyarrow
+
+
+def _get_unique_keys(columns: list) -> list:
+    """Returns the column names as unique keys, renaming the repeated names: 'file', 'file' -> 'file', 'file_2'"""
+
+    keys = []
+    for column in columns:
+        key, n = str(column), 1
+        while key in keys:
+            n += 1
+            key = f"{column}_{n}"
+        keys.append(key)
+    return keys
+
+
+class _ReportWriter(ABC):
+    """Base of the report writers, routing the appended sheets to a table for each distinct headers."""
+
+    suffix = None
+
+    def __init__(self, file: str, *, title_column="sheet"):
+        if not file.lower().endswith(self.suffix):
+            file = file + self.suffix
+
+        self.file = str(Path(file).absolute())
+        self.title_column = title_column
+        self._tables = {}  # headers -> table
+        self._files = []
+        self._closed = False
+
+    def append(self, title: str, headers, rows: Iterable, *, sheet_id=None):
+        """Appends the rows of the sheet to the table for its headers, creating the table if needed.
+
+        :argument rows
+            Iterable of rows, consumed lazily.
+
+        :argument sheet_id
+            Not used, the rows are identified by the title (kept for compatibility with XlsxStreamWriter).
+        """
+
+        if self._closed:
+            raise RuntimeError("Writer is already closed!")
+
+        key = tuple(headers)
+        table = self._tables.get(key)
+        if table is None:
+            if self._files:
+                path = Path(self.file)
+                file = str(path.with_name(f"{path.stem}_{len(self._files) + 1}{self.suffix}"))
+                _log.info("sheet '%s' has other headers than the previous sheets, writing it to: '%s'", title, file)
+            else:
+                file = self.file
+
+            columns = list(headers) if self.title_column is None else [self.title_column] + list(headers)
+            _log.debug("creating %s report table at: '%s' with columns: %s", self.suffix, file, columns)
+            table = self._tables[key] = self._open_table(file, columns)
+            self._files.append(file)
+
+        if self.title_column is not None:
+            rows = ([title] + list(row) for row in rows)
+        self._write_rows(table, rows)
+
+    def get_files(self) -> List[str]:
+        """Returns the absolute paths of the written tables, in creation order."""
+
+        return list(self._files)
+
+    def close(self) -> str:
+        """Finishes all tables and returns the absolute path of the first one (the target file)."""
+
+        if not self._closed:
+            for table in self._tables.values():
+                self._close_table(table)
+            if not self._tables:
+                self._close_table(self._open_table(self.file, [] if self.title_column is None else [self.title_column]))
+                self._files.append(self.file)
+
+            _log.debug("done writing %s report to: %s", self.suffix, self._files)
+            self._closed = True
+        return self.file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @abstractmethod
+    def _open_table(self, file: str, columns: list):
+        """Creates the table file with the columns and returns the table (passed to the other methods)."""
+
+    @abstractmethod
+    def _write_rows(self, table, rows: Iterable):
+        """Writes (or buffers) the rows to the table."""
+
+    @abstractmethod
+    def _close_table(self, table):
+        """Writes the buffered rows and closes the table file."""
+
+
+class CsvReportWriter(_ReportWriter):
+    """Writes the sheets data as UTF-8 CSV table(s) with header."""
+
+    suffix = ".csv"
+
+    def _open_table(self, file: str, columns: list):
+        fp = open(file, mode="w", encoding="utf-8", newline="")
+        csv.writer(fp).writerow(columns)
+        return fp
+
+    def _write_rows(self, table, rows: Iterable):
+        csv.writer(table).writerows(rows)
+
+    def _close_table(self, table):
+        table.close()
+
+
+class JsonLinesReportWriter(_ReportWriter):
+    """Writes the sheets data as JSON Lines table(s), one object (column -> value) per row.
+
+    The repeated column names are renamed to unique keys ('file', 'file_2', ...), and the fields of the rows
+    that are longer than the headers are kept under the keys 'column_<n>' (n is the field position, from 1).
+    """
+
+    suffix = ".jsonl"
+
+    def _open_table(self, file: str, columns: list):
+        return open(file, mode="w", encoding="utf-8"), _get_unique_keys(columns)
+
+    def _write_rows(self, table, rows: Iterable):
+        fp, keys = table
+        for row in rows:
+            while len(keys) < len(row):
+                keys.append(_get_unique_keys(keys + [f"column_{len(keys) + 1}"])[-1])
+            fp.write(json.dumps(dict(zip(keys, row)), ensure_ascii=False))
+            fp.write("\n")
+
+    def _close_table(self, table):
+        table[0].close()
+
+
+class _ArrowReportWriter(_ReportWriter):
+    """Base of the pyarrow based writers, all columns are written as strings (None for the missing fields)."""
+
+    def __init__(self, file: str, *, title_column="sheet"):
+        self._pyarrow = _import_pyarrow()
+        super().__init__(file, title_column=title_column)
+
+    @abstractmethod
+    def _new_writer(self, file: str, schema):
+        """Creates the pyarrow writer of the table file."""
+
+    def _open_table(self, file: str, columns: list):
+        pa = self._pyarrow
+        schema = pa.schema([(column, pa.string()) for column in columns])
+        return self._new_writer(file, schema), schema, []
+
+    def _write_rows(self, table, rows: Iterable):
+        pending = table[2]
+        for row in rows:
+            pending.append(row)
+            if len(pending) >= _ARROW_BATCH_ROWS:
+                self._write_batch(table)
+
+    def _write_batch(self, table):
+        pa = self._pyarrow
+        writer, schema, pending = table
+        width = len(schema)
+        rows = ((row[:width] if len(row) >= width else list(row) + [None] * (width - len(row))) for row in pending)
+        arrays = [pa.array([value if (value is None or isinstance(value, str)) else str(value) for value in column],
+                           type=pa.string())
+                  for column in zip(*rows)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        pending.clear()
+
+    def _close_table(self, table):
+        if table[2]:
+            self._write_batch(table)
+        table[0].close()
+
+
+class ParquetReportWriter(_ArrowReportWriter):
+    """Writes the sheets data as Parquet table(s), a row group per _ARROW_BATCH_ROWS rows."""
+
+    suffix = ".parquet"
+
+    def _new_writer(self, file: str, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(file, schema)
+
+
+class FeatherReportWriter(_ArrowReportWriter):
+    """Writes the sheets data as Feather (v2, Arrow IPC) table(s), readable with pandas.read_feather."""
+
+    suffix = ".feather"
+
+    def _new_writer(self, file: str, schema):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(file, schema)
+
+
+# file extension -> writer class
+REPORT_WRITERS = {
+    CsvReportWriter.suffix: CsvReportWriter,
+    JsonLinesReportWriter.suffix: JsonLinesReportWriter,
+    ParquetReportWriter.suffix: ParquetReportWriter,
+    FeatherReportWriter.suffix: FeatherReportWriter,
+    ".xlsx": XlsxStreamWriter,
+}
+
+
+def get_report_writer(file: str, **kwargs):
+    """Creates the report writer for the extension of the file (see REPORT_WRITERS)."""
+
+    suffix = Path(file).suffix.lower()
+    if suffix not in REPORT_WRITERS:
+        raise ValueError(f"Unsupported report file extension: '{suffix}' (expected one of: {list(REPORT_WRITERS)})")
+    return REPORT_WRITERS[suffix](file, **kwargs)
+
+
+def write_report(file: str, sheets_data: Iterable[tuple], **kwargs) -> str:
+    """Writes the sheets data to the file, in the format chosen by its extension (see REPORT_WRITERS).
+
+    :argument sheets_data
+        Iterable of tuples, each describing sheet data, with the following format
+        [(sheet1_title, sheet1_headers, sheet1_rows), (sheet2_title, sheet2_headers, sheet2_rows), ...]
+        The rows can be lazy iterables, they are consumed while writing.
+
+    :returns
+        absolute path to the file where the data was written
+    """
+
+    with get_report_writer(file, **kwargs) as writer:
+        _log.debug("writing sheets data to report at: '%s'", writer.file)
+        for sheet_id, (title, headers, rows) in enumerate(sheets_data):
+            writer.append(title, headers, rows, sheet_id=sheet_id)
+    return writer.file
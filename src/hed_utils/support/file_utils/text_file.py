@@ -1,21 +1,73 @@
+import atexit
+import codecs
 import logging
-from concurrent.futures import ProcessPoolExecutor
+import os
+import re
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from os.path import getsize
 from pathlib import Path
-from typing import Union
+from typing import Iterable, Iterator, List, Optional, Union
 
+from hed_utils.support.file_utils.compressed_file import is_compressed, open_file
 from hed_utils.support.file_utils.file_sys import prepare_tmp_location, view_file
+from hed_utils.support.file_utils.mmap_file import mmap_safe_encoding, open_mmap
 
 _log = logging.getLogger(__name__)
 _log.addHandler(logging.NullHandler())
 
+_BATCH_MAX_BYTES = 4 * 1024 * 1024  # small files are checked in batches of up to that many bytes
+_BATCH_MAX_FILES = 64
+_MAX_TASKS_IN_FLIGHT = 2 * (os.cpu_count() or 1)
 
-def text_in_lines(file: Union[str, Path], text: str, ignorecase=True, encoding="utf-8") -> bool:
-    """Checks file contains the text in any of it's lines"""
+# shared worker pool, kept warm between the searches
+_pool: Optional[ProcessPoolExecutor] = None
+
+# line that contains the searched text, line_no is 1-based, byte_offset is the position of the line in the file,
+# before and after are tuples with the context lines
+TextHit = namedtuple("TextHit", "file line_no byte_offset line before after")
+
+
+def _get_mmap_needle(text: str, ignorecase, encoding) -> Optional[bytes]:
+    """Returns the encoded text if it can be found by searching the raw bytes of the file, None otherwise.
+
+    That requires encoding safe for raw bytes search, text without newlines (which are not translated),
+    and ASCII text if ignorecase (only ASCII letters are case-folded at bytes level)."""
+
+    needle_encoding = mmap_safe_encoding(encoding)
+    if (needle_encoding is None) or ("\n" in text) or ("\r" in text):
+        return None
+
+    try:
+        return text.encode("ascii" if ignorecase else needle_encoding)
+    except UnicodeEncodeError:
+        return None
+
+
+def text_in_lines(file: Union[str, Path], text: str, ignorecase=True, encoding="utf-8", *, use_mmap=False) -> bool:
+    """Checks file contains the text in any of it's lines
+
+    If use_mmap is True (and the text/encoding allow it, see _get_mmap_needle) the encoded text is searched
+    directly in the memory-mapped file, without decoding it's contents.
+
+    Compressed files and zip members are decompressed while reading (see compressed_file).
+    """
+
+    needle = _get_mmap_needle(text, ignorecase, encoding) if (use_mmap and not is_compressed(file)) else None
+    if needle is not None:
+        with open_mmap(file) as mm:
+            if mm is None:
+                return False
+            if ignorecase:
+                return re.search(re.escape(needle), mm, flags=re.IGNORECASE) is not None
+            return mm.find(needle) != -1
 
     if ignorecase:
         text = text.lower()
 
-    with open(file, mode="r", encoding=encoding) as fp:
+    with open_file(file, mode="r", encoding=encoding) as fp:
         for line in fp:
             if ignorecase:
                 if text in line.lower():
@@ -26,23 +78,224 @@ def text_in_lines(file: Union[str, Path], text: str, ignorecase=True, encoding="
     return False
 
 
-def _check_file(file, text, ignorecase, encoding):
-    return file, text_in_lines(file, text, ignorecase, encoding)
+def _get_pool() -> ProcessPoolExecutor:
+    """Returns the shared worker pool, starting it if needed."""
+
+    global _pool
+    if _pool is None:
+        _log.debug("starting text search worker pool")
+        _pool = ProcessPoolExecutor()
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Drops the broken pool (a worker process died), so a new one is started for the next tasks."""
+
+    global _pool
+    if _pool is pool:
+        _log.warning("text search worker pool is broken, it will be started again")
+        _pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown_pool():
+    """Stops the shared worker pool used by the text searches (it's started again by the next search)."""
+
+    global _pool
+    if _pool is not None:
+        _log.debug("shutting down text search worker pool")
+        _pool.shutdown(wait=True)
+        _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _iter_file_batches(files: Iterable[str]) -> Iterator[List[str]]:
+    """Lazily groups the files into batches of up to _BATCH_MAX_FILES files or _BATCH_MAX_BYTES total size."""
+
+    batch, batch_size = [], 0
+    for file in files:
+        try:
+            size = getsize(file)
+        except OSError:
+            size = 0  # let the worker report it
+
+        if batch and (batch_size + size > _BATCH_MAX_BYTES):
+            yield batch
+            batch, batch_size = [], 0
+
+        batch.append(file)
+        batch_size += size
+        if len(batch) >= _BATCH_MAX_FILES:
+            yield batch
+            batch, batch_size = [], 0
+
+    if batch:
+        yield batch
+
+
+def _iter_batch_results(fn, batches: Iterable[list], args: tuple, ordered: bool) -> Iterator:
+    """Runs fn(batch, *args) for each batch in the shared pool and yields the results.
 
+    Only a bounded number of tasks are submitted at a time, so the batches are consumed lazily.
+    With ordered=False the results are yielded as soon as they complete.
+    The tasks that did not start yet are cancelled if the caller stops early.
+    """
 
-def iter_files_containing_text_in_lines(files, text, ignorecase, encoding):
-    """Searches files that contain the given text in any of their lines, and yields the ones that do."""
+    pool = _get_pool()
+    batches = iter(batches)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < _MAX_TASKS_IN_FLIGHT:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                try:
+                    pending.append(pool.submit(fn, batch, *args))
+                except BrokenProcessPool:
+                    # the workers died since the pool was last used (e.g. killed while idle), retry in a new pool
+                    _discard_pool(pool)
+                    pool = _get_pool()
+                    pending.append(pool.submit(fn, batch, *args))
 
-    file_args = tuple(files)
-    args_count = len(file_args)
-    text_args = (text,) * args_count
-    ignorecase_args = (ignorecase,) * args_count
-    encoding_args = (encoding,) * args_count
+            if not pending:
+                return
 
-    with ProcessPoolExecutor() as pool:
-        for file, is_match in pool.map(_check_file, file_args, text_args, ignorecase_args, encoding_args):
-            if is_match:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)  # a worker died while running the tasks, the next search starts a new pool
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _check_files(files, text, ignorecase, encoding, use_mmap=False) -> List[str]:
+    return [file for file in files if text_in_lines(file, text, ignorecase, encoding, use_mmap=use_mmap)]
+
+
+def iter_files_containing_text_in_lines(files, text, ignorecase, encoding, *, use_mmap=False, ordered=True,
+                                        max_results=None):
+    """Searches files that contain the given text in any of their lines, and yields the ones that do.
+
+    The files are checked in batches by a shared pool of worker processes, that is reused across the calls.
+
+    :argument ordered
+        If True the matching files are yielded in the order of the given files,
+        otherwise as soon as they are found.
+
+    :argument max_results
+        If passed, the search stops after that many files are found (the outstanding work is cancelled).
+    """
+
+    if max_results is not None and max_results <= 0:
+        return
+
+    found = 0
+    results = _iter_batch_results(_check_files, _iter_file_batches(files), (text, ignorecase, encoding, use_mmap),
+                                  ordered)
+    try:
+        for matching_files in results:
+            for file in matching_files:
                 yield file
+                found += 1
+                if found == max_results:
+                    _log.debug("found max results (%s) for text: '%s'", max_results, text)
+                    return
+    finally:
+        results.close()
+
+
+def iter_text_hits_in_lines(file: Union[str, Path],
+                            text: str,
+                            ignorecase=True,
+                            encoding="utf-8",
+                            *,
+                            before=0,
+                            after=0) -> Iterator[TextHit]:
+    """Lazily yields TextHit(file, line_no, byte_offset, line, before, after) for each line containing the text.
+
+    The lines are yielded without their line endings. For compressed files (see compressed_file)
+    the byte offsets are in the decompressed contents.
+    Up to 'before' preceding and 'after' following lines are added as context (kept in a small ring buffer).
+    """
+
+    if ignorecase:
+        text = text.lower()
+
+    previous = deque(maxlen=before) if before else ()
+    waiting = deque()  # hits that are still collecting their after-context lines
+    encode = codecs.getincrementalencoder(encoding)().encode
+    offset = 0
+
+    with open_file(file, mode="r", encoding=encoding, newline="") as fp:
+        for line_no, raw_line in enumerate(fp, start=1):
+            line = raw_line.rstrip("\r\n")
+
+            for hit in waiting:
+                hit.after.append(line)
+            while waiting and (len(waiting[0].after) == after):
+                hit = waiting.popleft()
+                yield hit._replace(after=tuple(hit.after))
+
+            if text in (line.lower() if ignorecase else line):
+                hit = TextHit(file, line_no, offset, line, tuple(previous), [])
+                if after:
+                    waiting.append(hit)
+                else:
+                    yield hit._replace(after=())
+
+            if before:
+                previous.append(line)
+            offset += len(encode(raw_line))
+
+    for hit in waiting:
+        yield hit._replace(after=tuple(hit.after))
+
+
+def _find_text_hits(files, text, ignorecase, encoding, before, after, max_results) -> List[TextHit]:
+    hits = []
+    for file in files:
+        hits.extend(islice(iter_text_hits_in_lines(file, text, ignorecase, encoding, before=before, after=after),
+                           max_results))
+        if (max_results is not None) and (len(hits) >= max_results):
+            break
+    return hits
+
+
+def iter_lines_containing_text(files, text, ignorecase, encoding, *, before=0, after=0, ordered=True,
+                               max_results=None) -> Iterator[TextHit]:
+    """Searches the lines of the files for the given text, and yields TextHit for each matching line.
+
+    Runs on the same shared worker pool as iter_files_containing_text_in_lines (see it for ordered/max_results),
+    the hits of each file are always yielded in the order of their lines.
+    See iter_text_hits_in_lines for the hit details and the context lines.
+    """
+
+    if max_results is not None and max_results <= 0:
+        return
+
+    found = 0
+    results = _iter_batch_results(_find_text_hits, _iter_file_batches(files),
+                                  (text, ignorecase, encoding, before, after, max_results), ordered)
+    try:
+        for hits in results:
+            for hit in hits:
+                yield hit
+                found += 1
+                if found == max_results:
+                    _log.debug("found max results (%s) for text: '%s'", max_results, text)
+                    return
+    finally:
+        results.close()
 
 
 def view_text(text: str, encoding="utf-8"):
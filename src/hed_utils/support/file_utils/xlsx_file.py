@@ -1,11 +1,21 @@
 """This module contains helper methods for dealing with excel files.
         Credits: https://realpython.com/openpyxl-excel-spreadsheets-python/
 """
+import json
 import logging
+import os
 import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from copy import copy
+from functools import partial
+from itertools import groupby, islice, zip_longest
+from multiprocessing import Manager
+from operator import itemgetter
 from pathlib import Path
-from typing import List
+from queue import Full
+from random import Random
+from typing import Iterable, Iterator, List
 
 from openpyxl.styles import fonts
 
@@ -14,8 +24,12 @@ _custom_font = copy(fonts.DEFAULT_FONT)
 _custom_font.name = "Consolas"
 fonts.DEFAULT_FONT = _custom_font
 
-from openpyxl import Workbook  # pylint: disable E402
+from lxml import etree  # pylint: disable E402
+from more_itertools import peekable
+from openpyxl import Workbook, load_workbook  # pylint: disable E402
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
+from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 
 _log = logging.getLogger(__name__)
@@ -23,6 +37,20 @@ _log.addHandler(logging.NullHandler())
 
 _INVALID_SHEET_TITLE_REGEX = re.compile(r"[\\*?:/\[\]]")
 
+MAX_SHEET_ROWS = 1048576  # Excel limit, the header included
+
+_MAX_SHEET_TITLE_LENGTH = 31
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_PACKAGE_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+# rows sampled per sheet for sizing the columns (buffered by XlsxStreamWriter, as the widths are written first)
+WIDTH_SAMPLE_ROWS = 1000
+
+_WORKBOOK_BATCH_ROWS = 10000  # rows sent to a workbook writer process at once
+_WORKBOOK_QUEUE_BATCHES = 4  # batches buffered for each workbook writer process
+
 
 def _sanitize_sheet_title(text: str) -> str:
     """Strips the text and transforms it into valid worksheet title by replacing the invalid chars with underscore"""
@@ -32,6 +60,26 @@ def _sanitize_sheet_title(text: str) -> str:
     return _INVALID_SHEET_TITLE_REGEX.sub("_", text) if _INVALID_SHEET_TITLE_REGEX.search(text) else text
 
 
+def _part_title(title: str, part: int) -> str:
+    """Returns the title of the sheet continuing data that overflows previous sheets: 'title', 'title (2)', ..."""
+
+    if part == 1:
+        return title
+
+    suffix = f" ({part})"
+    return title.strip()[:_MAX_SHEET_TITLE_LENGTH - len(suffix)] + suffix
+
+
+def _split_sheet_rows(title: str, rows, max_rows: int):
+    """Yields (title, rows) for each of the sheets needed for the rows (sequence), with up to max_rows rows each."""
+
+    for part, start in enumerate(range(0, max(len(rows), 1), max_rows), 1):
+        if part > 1:
+            _log.info("sheet '%s' overflows [ %s ] rows, continuing in sheet '%s'",
+                      title, max_rows, _part_title(title, part))
+        yield _part_title(title, part), rows[start:start + max_rows]
+
+
 def _apply_header_style(sheet: Worksheet):
     """Applies header style to the first row in the sheet."""
 
@@ -66,22 +114,23 @@ def _freeze_header(sheet: Worksheet):
     sheet.freeze_panes = "A2"
 
 
-def _optimize_columns_width(sheet: Worksheet):
-    """Optimizes the columns widths to match the contents"""
+def _get_columns_widths(rows) -> dict:
+    """Returns the max length of the values in each column (by column index) of the rows, in a single pass."""
 
-    _log.debug("optimizing columns width in sheet: %s", sheet)
-    dims = {}
-    for row in sheet.rows:
-        for cell in row:
-            if cell.value:
-                dims[cell.column_letter] = max((dims.get(cell.column_letter, 0), len(str(cell.value))))
+    widths = {}
+    for idx, column in enumerate(zip_longest(*rows), 1):
+        width = max((len(str(value)) for value in column if value), default=0)
+        if width:
+            widths[idx] = width
+    return widths
 
-    for col, value in dims.items():
-        sheet.column_dimensions[col].width = value + 1
 
+def _append_sheet_data(workbook: Workbook, title, headers, rows, *, width_sample_rows=WIDTH_SAMPLE_ROWS) -> Worksheet:
+    """Creates new Worksheet in the Workbook, then fills-in the data and applies styling to the header.
 
-def _append_sheet_data(workbook: Workbook, title, headers, rows) -> Worksheet:
-    """Creates new Worksheet in the Workbook, then fills-in the data and applies styling to the header"""
+    The columns widths are computed while the rows are appended, from the header, the first width_sample_rows rows
+    and a random sample (reservoir) of width_sample_rows of the remaining rows.
+    """
 
     _log.debug("appending [%s] rows of sheet data with title '%s' and headers: %s", len(rows), title, headers)
 
@@ -94,16 +143,33 @@ def _append_sheet_data(workbook: Workbook, title, headers, rows) -> Worksheet:
     sheet.append(headers)
     _apply_header_style(sheet)
 
-    for row in rows:
+    sample = [headers]
+    reservoir = []
+    random = Random(0)  # same data gives the same widths
+    for count, row in enumerate(rows):
         sheet.append(row)
+        if count < width_sample_rows:
+            sample.append(row)
+        elif len(reservoir) < width_sample_rows:
+            reservoir.append(row)
+        else:
+            idx = random.randrange(count - width_sample_rows + 1)
+            if idx < width_sample_rows:
+                reservoir[idx] = row
+
+    _log.debug("optimizing columns width in sheet: %s", sheet)
+    for idx, width in _get_columns_widths(sample + reservoir).items():
+        sheet.column_dimensions[get_column_letter(idx)].width = width + 1
 
     return sheet
 
 
-def xlsx_workbook_from_sheets_data(sheets_data: List[tuple], *, auto_filter=True, freeze_header=True) -> Workbook:
+def xlsx_workbook_from_sheets_data(sheets_data: List[tuple], *, auto_filter=True, freeze_header=True,
+                                   max_sheet_rows=MAX_SHEET_ROWS) -> Workbook:
     """Creates openpyxl.Workbook instance and populates it using multiple sheets data.
 
     Adds filters and freezes header by default.
+    Rows over max_sheet_rows (header included) continue in sheets titled 'title (2)', 'title (3)', ...
 
     :argument sheets_data
         List containing tuples, each describing sheet data, with the following format
@@ -126,22 +192,24 @@ def xlsx_workbook_from_sheets_data(sheets_data: List[tuple], *, auto_filter=True
     workbook.remove(zero_sheet)
 
     for title, headers, rows in sheets_data:
-        sheet = _append_sheet_data(workbook, title, headers, rows)
-
-        _optimize_columns_width(sheet)
+        for part_title, part_rows in _split_sheet_rows(title, rows, max_sheet_rows - 1):
+            sheet = _append_sheet_data(workbook, part_title, headers, part_rows)
 
-        if auto_filter:
-            _auto_filter(sheet)
+            if auto_filter:
+                _auto_filter(sheet)
 
-        if freeze_header:
-            _freeze_header(sheet)
+            if freeze_header:
+                _freeze_header(sheet)
 
     return workbook
 
 
-def xlsx_write_sheets_data(file: str, sheets_data: List[tuple], *, auto_filter=True, freeze_header=True) -> str:
+def xlsx_write_sheets_data(file: str, sheets_data: List[tuple], *, auto_filter=True, freeze_header=True,
+                           max_sheet_rows=MAX_SHEET_ROWS) -> str:
     """Writes multiple sheets data to .xlsx file. Adds filters and freezes header by default.
 
+    Rows over max_sheet_rows (header included) continue in sheets titled 'title (2)', 'title (3)', ...
+
     :argument file
         Filepath pointing to where the data should be written.
         (.xlsx is automatically appended if missing)
@@ -167,8 +235,498 @@ def xlsx_write_sheets_data(file: str, sheets_data: List[tuple], *, auto_filter=T
     _log.debug("writing sheets data to .xlsx file at: '%s', auto-filter: %s, freeze-header: %s",
                file, auto_filter, freeze_header)
 
-    workbook = xlsx_workbook_from_sheets_data(sheets_data, auto_filter=auto_filter, freeze_header=freeze_header)
+    workbook = xlsx_workbook_from_sheets_data(sheets_data, auto_filter=auto_filter, freeze_header=freeze_header,
+                                              max_sheet_rows=max_sheet_rows)
     workbook.save(file)
 
     _log.debug("done writing sheets data to .xlsx file: '%s' !", file)
     return file
+
+
+class _SheetStream:
+    """State of a sheet written by XlsxStreamWriter."""
+
+    def __init__(self, sheet, title, headers, part):
+        self.sheet = sheet
+        self.title = title
+        self.headers = list(headers)
+        self.part = part
+        self.pending = []  # the first rows, buffered until the column widths are known (None once written)
+        self.rows_count = 0
+        self.max_col = len(self.headers)
+
+
+class XlsxStreamWriter:
+    """Writes sheets data to .xlsx file using the openpyxl write-only mode, so the rows are never kept in memory.
+
+    Rows can be appended to any of the sheets, in any order, and are written to disk right away.
+    The file itself is created when the writer is closed.
+
+    Like xlsx_write_sheets_data the header is styled and (by default) frozen and filtered, and the columns are
+    sized to their contents. The widths are written before the rows in the .xlsx format, so they are computed
+    as running max over the header and the first WIDTH_SAMPLE_ROWS rows of each sheet, which are buffered
+    until then. No second pass over the rows is made.
+
+    Rows over max_sheet_rows (header included) continue in sheets titled 'title (2)', 'title (3)', ...
+
+    If title_column is passed, the sheet title is also written in the first column of the rows, with that header
+    (the rows are identified by the sheet titles, so no such column is added by default).
+
+    Usage:
+
+        with XlsxStreamWriter("report.xlsx") as writer:
+            writer.append("sheet1", headers, rows)
+            writer.append("sheet2", headers2, rows2)
+            writer.append("sheet1", headers, more_rows)
+    """
+
+    def __init__(self, file: str, *, title_column=None, auto_filter=True, freeze_header=True,
+                 width_sample_rows=WIDTH_SAMPLE_ROWS, max_sheet_rows=MAX_SHEET_ROWS):
+        if not file.lower().endswith(".xlsx"):
+            file = file + ".xlsx"
+
+        self.file = str(Path(file).absolute())
+        self.title_column = title_column
+        self.auto_filter = auto_filter
+        self.freeze_header = freeze_header
+        self.width_sample_rows = width_sample_rows
+        self.max_sheet_rows = max_sheet_rows
+        self._workbook = Workbook(write_only=True)
+        self._sheets = {}  # sheet_id -> _SheetStream of the last sheet for the id
+        self._streams = []
+        self._closed = False
+
+    def append(self, title: str, headers, rows: Iterable, *, sheet_id=None):
+        """Appends rows to the sheet identified by sheet_id (default: title), creating the sheet if needed.
+
+        :argument rows
+            Iterable of rows, consumed lazily.
+
+        :argument sheet_id
+            Hashable key of the target sheet.
+            Allows appending to different sheets that share the same title (openpyxl renames the duplicates).
+        """
+
+        if self._closed:
+            raise RuntimeError("Writer is already closed!")
+
+        if self.title_column is not None:
+            headers = [self.title_column] + list(headers)
+            rows = ([title] + list(row) for row in rows)
+
+        key = title if sheet_id is None else sheet_id
+        stream = self._sheets.get(key)
+        if stream is None:
+            stream = self._sheets[key] = self._create_stream(title, headers, 1)
+
+        max_rows = self.max_sheet_rows - 1
+        for row in rows:
+            if stream.rows_count >= max_rows:
+                _log.info("sheet '%s' overflows [ %s ] rows, continuing in sheet '%s'",
+                          title, max_rows, _part_title(title, stream.part + 1))
+                stream = self._sheets[key] = self._create_stream(title, stream.headers, stream.part + 1)
+
+            if stream.pending is None:
+                stream.sheet.append(row)
+            else:
+                stream.pending.append(row)
+                if len(stream.pending) >= self.width_sample_rows:
+                    self._write_pending(stream)
+            stream.rows_count += 1
+            if len(row) > stream.max_col:
+                stream.max_col = len(row)
+
+    def _create_stream(self, title, headers, part) -> _SheetStream:
+        part_title = _part_title(title, part)
+        effective_title = _sanitize_sheet_title(part_title)
+        if effective_title != part_title:
+            _log.warning("transformed invalid sheet title '%s' to valid one: '%s'", part_title, effective_title)
+
+        _log.debug("creating write-only sheet with title '%s' and headers: %s", effective_title, headers)
+        stream = _SheetStream(self._workbook.create_sheet(title=effective_title), title, headers, part)
+        self._streams.append(stream)
+        return stream
+
+    def get_sheets_rows(self) -> List[tuple]:
+        """Returns list of tuples (sheet_title, rows_count) of the created sheets, the headers not counted."""
+
+        return [(stream.sheet.title, stream.rows_count) for stream in self._streams]
+
+    def _write_pending(self, stream: _SheetStream):
+        """Sizes the columns, freezes the header, then writes the styled header and the buffered rows."""
+
+        sheet = stream.sheet
+        for idx, width in _get_columns_widths([stream.headers] + stream.pending).items():
+            sheet.column_dimensions[get_column_letter(idx)].width = width + 1
+        if self.freeze_header:
+            sheet.freeze_panes = "A2"
+
+        if stream.headers:
+            sheet.append([self._header_cell(sheet, header) for header in stream.headers])
+        for row in stream.pending:
+            sheet.append(row)
+        stream.pending = None
+
+    @staticmethod
+    def _header_cell(sheet, value) -> WriteOnlyCell:
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.font = Font(name="Consolas", bold=True)
+        cell.border = Border(bottom=Side(border_style="thin"))
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        return cell
+
+    def close(self) -> str:
+        """Saves the workbook to the target file and returns it's absolute path."""
+
+        if not self._closed:
+            if not self._streams:
+                self._workbook.create_sheet()
+
+            for stream in self._streams:
+                if stream.pending is not None:
+                    self._write_pending(stream)
+                if self.auto_filter and stream.max_col:
+                    # the filter is written after the rows, so it can be set last
+                    last_row = stream.rows_count + (1 if stream.headers else 0)
+                    stream.sheet.auto_filter.ref = f"A1:{get_column_letter(stream.max_col)}{max(last_row, 1)}"
+
+            _log.debug("saving streamed sheets data ([ %s ] sheets) to .xlsx file at: '%s'",
+                       len(self._streams), self.file)
+            self._workbook.save(self.file)
+            self._closed = True
+        return self.file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def xlsx_stream_sheets_data(file: str, sheets_data: Iterable[tuple], *, auto_filter=True, freeze_header=True,
+                            max_sheet_rows=MAX_SHEET_ROWS) -> str:
+    """Streaming version of xlsx_write_sheets_data, for big data (see XlsxStreamWriter).
+
+    :argument sheets_data
+        Iterable of tuples, each describing sheet data, with the following format
+        [(sheet1_title, sheet1_headers, sheet1_rows), (sheet2_title, sheet2_headers, sheet2_rows), ...]
+        The rows can be lazy iterables, they are consumed while writing.
+
+    :returns
+        absolute path to the file where the data was written
+    """
+
+    with XlsxStreamWriter(file, auto_filter=auto_filter, freeze_header=freeze_header,
+                          max_sheet_rows=max_sheet_rows) as writer:
+        _log.debug("streaming sheets data to .xlsx file at: '%s', auto-filter: %s, freeze-header: %s",
+                   writer.file, auto_filter, freeze_header)
+        for sheet_id, (title, headers, rows) in enumerate(sheets_data):
+            writer.append(title, headers, rows, sheet_id=sheet_id)
+    return writer.file
+
+
+def _write_workbook(file: str, batches: Iterable[tuple], auto_filter, freeze_header) -> List[tuple]:
+    """Writes the (sheet_key, title, headers, rows) batches, returns [(sheet_title, rows_count), ...] of the sheets."""
+
+    with XlsxStreamWriter(file, auto_filter=auto_filter, freeze_header=freeze_header) as writer:
+        for sheet_key, title, headers, rows in batches:
+            writer.append(title, headers, rows, sheet_id=sheet_key)
+    return writer.get_sheets_rows()
+
+
+def _write_queued_workbook(file: str, queue, auto_filter, freeze_header) -> List[tuple]:
+    """Writes the batches taken from the queue until None (in a worker process), see _write_workbook."""
+
+    return _write_workbook(file, iter(queue.get, None), auto_filter, freeze_header)
+
+
+def _iter_workbooks_batches(sheets_data: Iterable[tuple], max_workbook_rows: int, max_sheet_rows: int,
+                            batch_size: int) -> Iterator[tuple]:
+    """Yields (workbook_index, (sheet_key, title, headers, rows)) for the sheets data, with up to batch_size rows.
+
+    The rows are read lazily and the workbooks are filled up to max_workbook_rows rows in total.
+    Sheets with more rows than fit in the rest of the workbook (or in a sheet) continue in the next parts:
+    'title', 'title (2)', ... (in the next workbook when the current one is full).
+    """
+
+    max_part_rows = min(max_workbook_rows, max_sheet_rows - 1)
+    workbook = workbook_rows = 0
+    for sheet_id, (title, headers, rows) in enumerate(sheets_data):
+        rows = peekable(rows)
+        part = part_rows = 0
+        while (part == 0) or rows:
+            if (part == 0) or (part_rows >= max_part_rows) or (workbook_rows >= max_workbook_rows):
+                if (workbook_rows >= max_workbook_rows) and rows:
+                    workbook, workbook_rows = workbook + 1, 0
+                part, part_rows = part + 1, 0
+                if part > 1:
+                    _log.info("sheet '%s' overflows the workbook or the sheet rows, continuing in sheet '%s'",
+                              title, _part_title(title, part))
+
+            capacity = min(batch_size, max_part_rows - part_rows, max_workbook_rows - workbook_rows)
+            batch = list(islice(rows, capacity))
+            yield workbook, ((sheet_id, part), _part_title(title, part), headers, batch)
+            part_rows += len(batch)
+            workbook_rows += len(batch)
+
+
+def _put_batch(queue, batch, future):
+    """Puts the batch in the workbook writer queue, re-raising the error of the writer if it failed meanwhile."""
+
+    while True:
+        try:
+            queue.put(batch, timeout=0.5)
+            return
+        except Full:
+            if future.done():
+                future.result()
+                raise RuntimeError("The workbook writer stopped before taking all rows!")
+
+
+def xlsx_write_workbooks(file: str, sheets_data: Iterable[tuple], *, max_workbook_rows=MAX_SHEET_ROWS - 1,
+                         workers: int = None, auto_filter=True, freeze_header=True,
+                         max_sheet_rows=MAX_SHEET_ROWS) -> str:
+    """Writes big multi-sheet data as multiple .xlsx files, generated in parallel by worker processes.
+
+    The sheets are grouped in workbooks with up to max_workbook_rows rows each, written as
+    '<file>_001.xlsx', '<file>_002.xlsx', ... (see XlsxStreamWriter), together with JSON manifest
+    '<file>.manifest.json' listing the sheets (and their rows count) in each of the workbooks.
+
+    :argument sheets_data
+        Iterable of tuples, each describing sheet data, with the following format
+        [(sheet1_title, sheet1_headers, sheet1_rows), (sheet2_title, sheet2_headers, sheet2_rows), ...]
+
+        The rows can be lazy iterables, they are sent to the worker processes in bounded batches while reading them.
+        The workbooks are filled up to max_workbook_rows, the sheets that don't fit continue in the next workbook.
+
+    :argument workers
+        Max count of the worker processes (default: the CPUs count), 1 writes the workbooks in this process.
+
+    :returns
+        absolute path to the manifest file
+    """
+
+    if file.endswith(".xlsx"):
+        file = file[:-len(".xlsx")]
+    file = str(Path(file).absolute())
+
+    workers = workers or os.cpu_count() or 1
+    _log.debug("writing sheets data as .xlsx files at: '%s_*.xlsx' using up to [ %s ] workers", file, workers)
+
+    batches = _iter_workbooks_batches(sheets_data, max_workbook_rows, max_sheet_rows, _WORKBOOK_BATCH_ROWS)
+    workbooks = ((f"{file}_{idx + 1:03d}.xlsx", (batch for _, batch in group))
+                 for idx, group in groupby(batches, key=itemgetter(0)))
+    files = []
+    if workers > 1:
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for workbook_file, workbook in workbooks:
+                queue = manager.Queue(maxsize=_WORKBOOK_QUEUE_BATCHES)
+                future = pool.submit(_write_queued_workbook, workbook_file, queue, auto_filter, freeze_header)
+                for batch in workbook:
+                    _put_batch(queue, batch, future)
+                _put_batch(queue, None, future)
+                files.append(workbook_file)
+                futures.append(future)
+            workbooks_sheets = [future.result() for future in futures]
+    else:
+        workbooks_sheets = []
+        for workbook_file, workbook in workbooks:
+            workbooks_sheets.append(_write_workbook(workbook_file, workbook, auto_filter, freeze_header))
+            files.append(workbook_file)
+
+    if not files:
+        files.append(f"{file}_001.xlsx")
+        workbooks_sheets.append(_write_workbook(files[0], [], auto_filter, freeze_header))
+
+    manifest = {"workbooks": [{"file": Path(workbook_file).name,
+                               "sheets": [{"title": title, "rows": rows_count} for title, rows_count in sheets]}
+                              for workbook_file, sheets in zip(files, workbooks_sheets)]}
+    manifest_file = f"{file}.manifest.json"
+    with open(manifest_file, mode="w", encoding="utf-8") as fp:
+        json.dump(manifest, fp, ensure_ascii=False, indent=2)
+
+    _log.debug("done writing sheets data as [ %s ] .xlsx files, manifest: '%s' !", len(files), manifest_file)
+    return manifest_file
+
+
+def _trim_row(row) -> list:
+    """Returns the row values as list, without the trailing missing cells (None padding, not the empty strings)."""
+
+    row = list(row)
+    while row and row[-1] is None:
+        row.pop()
+    return row
+
+
+def _get_openpyxl_cell_value(cell):
+    # empty strings are stored as string cells without text, which openpyxl reads as None
+    if (cell.value is None) and (cell.data_type in ("s", "inlineStr")):
+        return ""
+    return cell.value
+
+
+def _iter_openpyxl_rows(sheet):
+    for row in sheet.iter_rows():
+        yield _trim_row(_get_openpyxl_cell_value(cell) for cell in row)
+
+
+def _open_openpyxl_sheets(file: str) -> tuple:
+    """Opens the workbook with openpyxl in read-only mode.
+
+    :returns tuple (sheets, close) where sheets is list of (title, rows_factory) tuples
+    """
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    return [(sheet.title, partial(_iter_openpyxl_rows, sheet)) for sheet in workbook.worksheets], workbook.close
+
+
+def _get_xml_text(element) -> str:
+    return "".join(node.text or "" for node in element.iter(_MAIN_NS + "t"))
+
+
+def _get_xml_cell_value(cell, shared_strings: list):
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        return _get_xml_text(cell)
+
+    value = cell.findtext(_MAIN_NS + "v")
+    if value is None:
+        return None
+    if cell_type == "s":
+        return shared_strings[int(value)]
+    if cell_type == "b":
+        return value == "1"
+    if cell_type == "n":
+        return float(value) if ("." in value or "E" in value or "e" in value) else int(value)
+    return value  # 'str' (formula result) and 'e' (error)
+
+
+def _get_column_index(ref: str) -> int:
+    """Returns the zero based column index of the cell reference, e.g. 'AB12' -> 27"""
+
+    idx = 0
+    for char in ref:
+        if char.isdigit():
+            break
+        idx = idx * 26 + ord(char) - 64
+    return idx - 1
+
+
+def _iter_xml_rows(archive: zipfile.ZipFile, member: str, shared_strings: list):
+    """Yields the values of the rows in the sheet XML, clearing the parsed elements to keep the memory bounded."""
+
+    next_row = 1
+    with archive.open(member) as fp:
+        for _, row in etree.iterparse(fp, tag=_MAIN_NS + "row"):
+            row_number = int(row.get("r", next_row))
+            for _ in range(next_row, row_number):
+                yield []
+            next_row = row_number + 1
+
+            values = []
+            for cell in row.iterchildren(_MAIN_NS + "c"):
+                ref = cell.get("r")
+                if ref:
+                    values.extend([None] * (_get_column_index(ref) - len(values)))
+                values.append(_get_xml_cell_value(cell, shared_strings))
+            yield _trim_row(values)
+
+            row.clear()
+            while row.getprevious() is not None:
+                del row.getparent()[0]
+
+
+def _open_xml_sheets(file: str) -> tuple:
+    """Opens the workbook archive for parsing the sheet XML directly with lxml.etree.iterparse.
+
+    :returns tuple (sheets, close) where sheets is list of (title, rows_factory) tuples
+    """
+
+    archive = zipfile.ZipFile(file)
+    try:
+        shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as fp:
+                for _, item in etree.iterparse(fp, tag=_MAIN_NS + "si"):
+                    shared_strings.append(_get_xml_text(item))
+                    item.clear()
+
+        targets = {rel.get("Id"): rel.get("Target")
+                   for rel in etree.fromstring(archive.read("xl/_rels/workbook.xml.rels")).iter(_PACKAGE_RELATIONSHIP)}
+        sheets = []
+        for sheet in etree.fromstring(archive.read("xl/workbook.xml")).iter(_MAIN_NS + "sheet"):
+            target = targets[sheet.get(_RELATIONSHIP_ID)]
+            member = target.lstrip("/") if target.startswith("/") else "xl/" + target
+            sheets.append((sheet.get("name"), partial(_iter_xml_rows, archive, member, shared_strings)))
+    except BaseException:
+        archive.close()
+        raise
+    return sheets, archive.close
+
+
+def _read_first_row(rows_factory) -> list:
+    rows = rows_factory()
+    try:
+        return next(rows, [])
+    finally:
+        rows.close()
+
+
+def _iter_continued_rows(rows_factories: list):
+    """Yields the rows of the first sheet, then the rows of the continuation sheets without their headers."""
+
+    yield from rows_factories[0]()
+    for rows_factory in rows_factories[1:]:
+        rows = rows_factory()
+        next(rows, None)
+        yield from rows
+
+
+def xlsx_read_sheets_data(file: str, *, engine="openpyxl", merge_continued=True) -> Iterator[tuple]:
+    """Reads sheets data from .xlsx file, with bounded memory (the rows are read lazily).
+
+    The output has the format of xlsx_write_sheets_data input, and round-trips with it:
+        (sheet1_title, sheet1_headers, sheet1_rows), (sheet2_title, sheet2_headers, sheet2_rows), ...
+    The headers and the rows are lists (without the trailing missing cells, the empty strings are kept as ''),
+    the rows are lazy iterators that can be consumed only until the next sheet is read.
+
+    :argument engine
+        'openpyxl' reads the sheets with openpyxl in read-only mode,
+        'lxml' parses the sheet XML directly with lxml.etree.iterparse, which is faster, but returns the values
+        as stored: dates are not converted (numbers) and formulas without cached results are None.
+
+    :argument merge_continued
+        If True, the rows of the continuation sheets ('title (2)', 'title (3)', ...) written for the rows over
+        the max rows of a sheet are read as part of the first sheet.
+        Sheets with such titles are merged only if they have the same headers as the first sheet.
+    """
+
+    _log.debug("reading sheets data from .xlsx file at: '%s' (engine: %s)", file, engine)
+    if engine == "openpyxl":
+        sheets, close = _open_openpyxl_sheets(file)
+    elif engine == "lxml":
+        sheets, close = _open_xml_sheets(file)
+    else:
+        raise ValueError(f"Unsupported engine: '{engine}' (expected 'openpyxl' or 'lxml')")
+
+    try:
+        idx = 0
+        while idx < len(sheets):
+            title, rows_factory = sheets[idx]
+            rows_factories = [rows_factory]
+            idx += 1
+            if merge_continued:
+                first_headers = _read_first_row(rows_factory)
+                while idx < len(sheets) and sheets[idx][0] == _part_title(title, len(rows_factories) + 1) \
+                        and _read_first_row(sheets[idx][1]) == first_headers:
+                    rows_factories.append(sheets[idx][1])
+                    idx += 1
+
+            rows = _iter_continued_rows(rows_factories)
+            headers = next(rows, [])
+            _log.debug("reading sheet data with title '%s' ([ %s ] sheets) and headers: %s",
+                       title, len(rows_factories), headers)
+            yield title, headers, rows
+    finally:
+        close()
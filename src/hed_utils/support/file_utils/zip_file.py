@@ -1,9 +1,11 @@
 import logging
-from os import walk
+from os.path import relpath
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from zipfile import ZipFile, ZipInfo
 
+from hed_utils.support.file_utils.file_sys import scan_contents
+
 _log = logging.getLogger(__name__)
 _log.addHandler(logging.NullHandler())
 
@@ -27,7 +29,7 @@ def extract_zip(src_zip, dst_dir, pwd=None):
     _log.debug("extraction complete!")
 
 
-def zip_dir(src_dir, dst_zip, *, skip_suffixes=None, dry=False):
+def zip_dir(src_dir, dst_zip, *, skip_suffixes=None, exclude_dirs=None, dry=False):
     _sep = 50 * "-"
 
     skip_suffixes = skip_suffixes or []
@@ -45,45 +47,41 @@ def zip_dir(src_dir, dst_zip, *, skip_suffixes=None, dry=False):
         tmp_zip_path = Path(tmp_dir).joinpath(dst_zip.name)
 
         with ZipFile(str(tmp_zip_path), mode="w") as zip_out:
-            for root, dirs, files in walk(src_dir):
-                root = Path(root)
-
-                for folder in dirs:
-                    folder = root.joinpath(folder)
+            for contents in scan_contents(src_dir, exclude_dirs=exclude_dirs):
 
-                    # add empty folders to the zip
-                    if not list(folder.iterdir()):
-                        _log.debug(_sep)
-                        folder_name = f"{str(folder.relative_to(src_dir))}/"
-                        _log.debug("empty dir: '%s'", folder_name)
+                # add empty folders to the zip
+                if (not contents.dirs) and (not contents.files) and (contents.dirpath != str(src_dir)):
+                    _log.debug(_sep)
+                    folder_name = f"{relpath(contents.dirpath, src_dir)}/"
+                    _log.debug("empty dir: '%s'", folder_name)
 
-                        if dry:
-                            continue
+                    if dry:
+                        continue
 
-                        zip_out.writestr(ZipInfo(folder_name), "")
+                    zip_out.writestr(ZipInfo(folder_name), "")
 
-                for file in files:
-                    file = root.joinpath(file)
+                for entry in contents.files:
                     _log.debug(_sep)
-                    _log.debug("adding:  '%s'", str(file))
+                    _log.debug("adding:  '%s'", entry.path)
 
                     should_skip = None
-                    for suffix in file.suffixes:
-                        if suffix in skip_suffixes:
-                            should_skip = suffix
-                            break
+                    if skip_suffixes:
+                        for suffix in Path(entry.name).suffixes:
+                            if suffix in skip_suffixes:
+                                should_skip = suffix
+                                break
 
                     if should_skip:
-                        _log.debug("skipped [%s]: %s", should_skip, str(file))
+                        _log.debug("skipped [%s]: %s", should_skip, entry.path)
                         continue
 
-                    arcname = str(file.relative_to(src_dir))
+                    arcname = relpath(entry.path, src_dir)
                     _log.debug("arcname: '%s'", arcname)
 
                     if dry:
                         continue
 
-                    zip_out.write(str(file), arcname=arcname)
+                    zip_out.write(entry.path, arcname=arcname)
 
         if not dry:
             dst_zip.write_bytes(tmp_zip_path.read_bytes())
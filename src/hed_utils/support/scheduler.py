@@ -0,0 +1,134 @@
+"""Largest-first (LPT) dispatching of tasks to an executor, with per-worker utilization stats.
+
+Executors run the tasks in submission order, so when the biggest task happens to be submitted last, one worker
+is still busy with it long after the others have finished. LptScheduler keeps the tasks in a priority queue
+and hands them to the executor only when it has a free worker, always picking the biggest pending task.
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Executor, Future
+from functools import partial
+from typing import List
+
+_log = logging.getLogger(__name__)
+_log.addHandler(logging.NullHandler())
+
+# busy_seconds is the time spent in tasks, utilization is the busy fraction of the scheduler wall time
+WorkerUsage = namedtuple("WorkerUsage", "pid tasks busy_seconds utilization")
+
+
+def _timed_call(fn, *args):
+    """Runs the task in the worker, measuring its duration.
+
+    :returns tuple with format: (worker_pid, busy_seconds, result)
+    """
+
+    started = time.perf_counter()
+    result = fn(*args)
+    return os.getpid(), time.perf_counter() - started, result
+
+
+class LptScheduler:
+    """Dispatches tasks to the executor largest-first, keeping at most max_in_flight of them submitted at once.
+
+    Usage:
+
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            scheduler = LptScheduler(pool, max_in_flight=4)
+            futures = [scheduler.submit(getsize(file), search, file) for file in files]
+            results = [future.result() for future in futures]
+            scheduler.log_usage()
+
+    The tasks are dispatched as they are submitted while there are free workers, so the work starts right away
+    even if the tasks are still being discovered. Set max_in_flight to the executor workers count,
+    as the tasks submitted to the executor can't be reordered anymore.
+    """
+
+    def __init__(self, executor: Executor, max_in_flight: int):
+        self.executor = executor
+        self.max_in_flight = max(1, max_in_flight)
+        self._lock = threading.Lock()
+        self._queue = []  # heap of (-size, sequence, future, fn, args)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._usage = {}  # pid -> [tasks, busy_seconds]
+        self._started = time.perf_counter()
+
+    def submit(self, size, fn, *args) -> Future:
+        """Schedules fn(*args) with the given size (estimated cost, e.g. bytes to read), returns Future for it."""
+
+        future = Future()
+        with self._lock:
+            heapq.heappush(self._queue, (-size, next(self._sequence), future, fn, args))
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if (not self._queue) or (self._in_flight >= self.max_in_flight):
+                    return
+                _, _, future, fn, args = heapq.heappop(self._queue)
+                self._in_flight += 1
+
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._in_flight -= 1
+                continue
+
+            try:
+                task = self.executor.submit(_timed_call, fn, *args)
+            except RuntimeError as e:  # the executor was shut down
+                with self._lock:
+                    self._in_flight -= 1
+                future.set_exception(e)
+                continue
+            task.add_done_callback(partial(self._on_done, future))
+
+    def _on_done(self, future: Future, task: Future):
+        with self._lock:
+            self._in_flight -= 1
+
+        try:
+            pid, busy_seconds, result = task.result()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            with self._lock:
+                usage = self._usage.setdefault(pid, [0, 0.0])
+                usage[0] += 1
+                usage[1] += busy_seconds
+            future.set_result(result)
+
+        self._dispatch()
+
+    def get_usage(self) -> List[WorkerUsage]:
+        """Returns the usage of each of the workers that ran tasks, since the scheduler was created."""
+
+        wall_seconds = max(time.perf_counter() - self._started, 1e-9)
+        with self._lock:
+            return [WorkerUsage(pid, tasks, busy_seconds, busy_seconds / wall_seconds)
+                    for pid, (tasks, busy_seconds) in sorted(self._usage.items())]
+
+    def log_usage(self, workers: int = None):
+        """Logs (as INFO) the utilization of each worker, and the total work compared to the wall time.
+
+        With perfect balancing the wall time approaches the total work divided by the workers count
+        (by default the count of workers that ran tasks).
+        """
+
+        wall_seconds = time.perf_counter() - self._started
+        usage = self.get_usage()
+        workers = workers or len(usage) or 1
+        total_seconds = sum(worker.busy_seconds for worker in usage)
+        for worker in usage:
+            _log.info("worker [ %s ]: %5d tasks, busy %.3fs (%.0f%%)",
+                      worker.pid, worker.tasks, worker.busy_seconds, 100 * worker.utilization)
+        _log.info("total work %.3fs on [ %s ] workers, wall time %.3fs (ideal %.3fs, utilization %.0f%%)",
+                  total_seconds, workers, wall_seconds, total_seconds / workers,
+                  100 * total_seconds / max(workers * wall_seconds, 1e-9))
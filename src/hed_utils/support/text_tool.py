@@ -1,33 +1,165 @@
+import calendar
 import html
 import re
 import sys
 import unicodedata
-
-from typing import List
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Tuple, Union
+
+
+_DATE_DIRECTIVE_PATTERNS = {
+    "%Y": r"[12]\d{3}",
+    "%y": r"\d{2}",
+    "%m": r"0[1-9]|1[0-2]",
+    "%d": r"0[1-9]|[12]\d|3[01]",
+    "%j": r"00[1-9]|0[1-9]\d|[12]\d{2}|3[0-5]\d|36[0-6]",
+    "%H": r"[01]\d|2[0-3]",
+    "%I": r"0[1-9]|1[0-2]",
+    "%M": r"[0-5]\d",
+    "%S": r"[0-5]\d|6[01]",
+    "%f": r"\d{1,6}",
+    "%z": r"Z|[+-]\d{2}:?\d{2}",
+    "%p": r"(?i:am|pm)",
+    "%b": lambda: _names_pattern(calendar.month_abbr[1:]),
+    "%B": lambda: _names_pattern(calendar.month_name[1:]),
+    "%a": lambda: _names_pattern(calendar.day_abbr),
+    "%A": lambda: _names_pattern(calendar.day_name),
+    "%%": "%",
+}
+
+# registry of the compiled date patterns, by strftime format
+_date_patterns: Dict[str, Pattern] = {}
+
+
+def _names_pattern(names: Iterable[str]) -> str:
+    return "(?i:" + "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True)) + ")"
+
+
+def get_date_pattern(datefmt: str) -> Pattern:
+    """Returns compiled regex matching dates in the given strftime format (generated once per format).
+
+    The date is in the first group, and it's not matched when adjacent to other digits.
+    Supports the %Y %y %m %d %j %H %I %M %S %f %z %p %b %B %a %A %% directives (zero-padded numbers).
+    """
+
+    pattern = _date_patterns.get(datefmt)
+    if pattern is None:
+        parts = []
+        for part in re.split(r"(%.)", datefmt):
+            if not part.startswith("%"):
+                parts.append(re.escape(part))
+                continue
+            directive = _DATE_DIRECTIVE_PATTERNS.get(part)
+            if directive is None:
+                raise ValueError(f"unsupported directive '{part}' in date format: '{datefmt}'")
+            parts.append(f"(?:{directive() if callable(directive) else directive})")
+
+        pattern = re.compile(r"(?<!\d)(" + "".join(parts) + r")(?!\d)")
+        _date_patterns[datefmt] = pattern
+    return pattern
 
 
 def find_dates(text: str, datefmt="%Y-%m-%d") -> List[str]:
-    date_patterns = {
-        "%Y-%m-%d": r"(?:\D|^)([12]\d{3}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01]))(?:\D|$)"
-    }
-    pattern = date_patterns[datefmt]
-    return list(re.findall(pattern, text))
+    return get_date_pattern(datefmt).findall(text)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text: str, datefmt: str) -> Optional[datetime]:
+    """Parses the matched date (cached, as the same dates tend to repeat in bulk data), None if it's not valid."""
+
+    try:
+        return datetime.strptime(text, datefmt)
+    except ValueError:
+        return None
+
+
+def find_dates_many(docs: Iterable[str], datefmt="%Y-%m-%d") -> Iterator[Tuple[int, str, datetime]]:
+    """Scans the documents (e.g. rows, or the lines of a file stream) for dates in the given strftime format.
+
+    Matches that are not valid dates (e.g. 2021-02-30) are skipped.
+
+    :yields tuple with format: (doc_index, match, parsed_datetime)
+    """
+
+    finditer = get_date_pattern(datefmt).finditer
+    for doc_index, doc in enumerate(docs):
+        for match in finditer(doc):
+            text = match.group(1)
+            parsed = _parse_date(text, datefmt)
+            if parsed is not None:
+                yield doc_index, text, parsed
 
 
-def get_indices(text: str, sub: str) -> List[str]:
+def iter_indices(text: str, sub: str) -> Iterator[int]:
+    """Lazily yields the indexes of the (non-overlapping) occurrences of 'sub' in 'text', in linear time."""
+
+    if not sub:
+        raise ValueError("can't get the indices of empty sub-string!")
+
+    idx = text.find(sub)
+    while idx != -1:
+        yield idx
+        idx = text.find(sub, idx + len(sub))
+
+
+def get_indices(text: str, sub: str) -> List[int]:
     """Gets all the indexes of occurrence of 'sub' in 'text'"""
 
-    indices = []
-    processed_chars = 0
-    working_part = text
+    return list(iter_indices(text, sub))
+
+
+def _trie_to_regex(node: dict) -> str:
+    """Serializes a (sub)trie of chars to regex that matches any of it's terms."""
+
+    is_end = "" in node
+    branches, single_chars = [], []
+    for char, child in sorted(node.items()):
+        if not char:
+            continue
+        if len(child) == 1 and "" in child:
+            single_chars.append(re.escape(char))
+        else:
+            branches.append(re.escape(char) + _trie_to_regex(child))
+
+    if len(single_chars) == 1:
+        branches.append(single_chars[0])
+    elif single_chars:
+        branches.append(f"[{''.join(single_chars)}]")
 
-    while sub in working_part:
-        idx = processed_chars + working_part.index(sub)
-        indices.append(idx)
-        processed_chars = idx + len(sub)
-        working_part = text[processed_chars:]
+    if not branches:
+        return ""
 
-    return indices
+    result = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if is_end:
+        result = f"(?:{result})?" if (len(branches) == 1 and len(result) > 1 and not single_chars) else f"{result}?"
+    return result
+
+
+def compile_terms_pattern(terms: Iterable[Union[str, bytes]], flags=0) -> Pattern:
+    """Compiles regex that matches any of the (non-empty) terms.
+
+    The alternation is built as a trie (e.g. 'foo', 'foobar', 'fox' -> 'fo(?:o(?:bar)?|x)'),
+    so a single pass over the text finds all of the terms at once, with little backtracking.
+    Works with bytes terms as well, producing bytes pattern.
+    """
+
+    terms = list(terms)
+    is_bytes = bool(terms) and isinstance(terms[0], bytes)
+    if is_bytes:
+        terms = [term.decode("latin-1") for term in terms]
+
+    trie = {}
+    for term in terms:
+        if not term:
+            continue
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    pattern = _trie_to_regex(trie) if trie else "(?!)"
+    return re.compile(pattern.encode("latin-1") if is_bytes else pattern, flags)
 
 
 def html_escape(text, quote=True):
@@ -38,20 +170,11 @@ def html_unescape(text):
     return html.unescape(text)
 
 
+_INVERT_QUOTES_TABLE = str.maketrans({"'": "\"", "\"": "'"})
+
+
 def invert_quotes(text: str):
-    QUOTE = "'"
-    QUOTES = "\""
-    single_quote_indices = get_indices(text, QUOTE)
-    double_quote_indices = get_indices(text, QUOTES)
-    inverted_chars = []
-    for i in range(len(text)):
-        if i in single_quote_indices:
-            inverted_chars.append(QUOTES)
-        elif i in double_quote_indices:
-            inverted_chars.append(QUOTE)
-        else:
-            inverted_chars.append(text[i])
-    return "".join(inverted_chars)
+    return text.translate(_INVERT_QUOTES_TABLE)
 
 
 def normalize_spacing(text: str) -> str:
@@ -60,30 +183,52 @@ def normalize_spacing(text: str) -> str:
     return re.sub(r"\s+", " ", text)
 
 
-def normalize(text, *, map_cmb=True, map_digits=True, map_whitespace=True, form="NFKD") -> str:  # pragma: no-cov
-    text = unicodedata.normalize(form, text)
+_WHITESPACE_MAP = {ord("\t"): " ",
+                   ord("\f"): " ",
+                   ord("\r"): None}
+
 
+@lru_cache(maxsize=None)
+def _get_normalize_table(map_cmb: bool, map_digits: bool, map_whitespace: bool) -> dict:
+    """Builds the str.translate table used by normalize (once per flags combination, it's costly)."""
+
+    table = {}
     if map_cmb:
-        cmb_map = dict.fromkeys(c
-                                for c
-                                in range(sys.maxunicode)
-                                if unicodedata.combining(chr(c)))
-        text = text.translate(cmb_map)
+        table.update(dict.fromkeys(c
+                                   for c
+                                   in range(sys.maxunicode)
+                                   if unicodedata.combining(chr(c))))
 
     if map_digits:
-        digits_map = {c: ord("0") + unicodedata.digit(chr(c))
+        table.update({c: ord("0") + unicodedata.digit(chr(c))
                       for c
                       in range(sys.maxunicode)
-                      if unicodedata.category(chr(c)) == "Nd"}
-        text = text.translate(digits_map)
+                      if unicodedata.category(chr(c)) == "Nd"})
 
     if map_whitespace:
-        whitespace_map = {ord("\t"): " ",
-                          ord("\f"): " ",
-                          ord("\r"): None}
-        text = text.translate(whitespace_map)
+        table.update(_WHITESPACE_MAP)
 
-    return text
+    return table
+
+
+def normalize(text, *, map_cmb=True, map_digits=True, map_whitespace=True, form="NFKD") -> str:  # pragma: no-cov
+    text = unicodedata.normalize(form, text)
+    table = _get_normalize_table(map_cmb, map_digits, map_whitespace)
+    return text.translate(table) if table else text
+
+
+def normalize_many(texts: Iterable[str],
+                   *,
+                   map_cmb=True,
+                   map_digits=True,
+                   map_whitespace=True,
+                   form="NFKD") -> Iterator[str]:
+    """Lazily normalizes each of the texts (see normalize)."""
+
+    table = _get_normalize_table(map_cmb, map_digits, map_whitespace)
+    for text in texts:
+        text = unicodedata.normalize(form, text)
+        yield text.translate(table) if table else text
 
 
 def split_to_lines(text: str, *, strip_text=True, strip_lines=True, keep_empty_lines=False) -> List[str]:
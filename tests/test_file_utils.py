@@ -1,6 +1,46 @@
-from unittest import TestCase
+import csv
+import gzip
+import importlib.util
+import json
+import lzma
+import time
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+from unittest.mock import patch
 
+from openpyxl import Workbook, load_workbook
+
+from hed_utils.support.file_utils import compressed_file
+from hed_utils.support.file_utils import csv_cache
+from hed_utils.support.file_utils import csv_file
+from hed_utils.support.file_utils import csv_index
+from hed_utils.support.file_utils import csv_sniff
 from hed_utils.support.file_utils import file_sys
+from hed_utils.support.file_utils import mmap_file
+from hed_utils.support.file_utils import report_file
+from hed_utils.support.file_utils import text_file
+from hed_utils.support.file_utils import xlsx_file
+from hed_utils.support.file_utils import zip_file
+
+HEADERS = ["id", "name", "note"]
+
+
+def _write_csv(file, rows, headers=HEADERS, encoding="utf-8"):
+    with open(file, mode="w", encoding=encoding, newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    return str(file)
+
+
+def _make_tree(folder: Path):
+    for file in ("a.csv", "b.TXT", "sub/c.csv", "sub/deep/d.csv", ".git/e.csv", "node_modules/f.csv"):
+        folder.joinpath(file).parent.mkdir(parents=True, exist_ok=True)
+        folder.joinpath(file).write_text(file)
+    folder.joinpath("empty").mkdir()
 
 
 class FileSysTest(TestCase):
@@ -8,3 +48,690 @@ class FileSysTest(TestCase):
         self.assertEqual(file_sys.format_size(10000), "9.8K")
         self.assertEqual(file_sys.format_size(100001221), "95.4M")
         self.assertEqual(file_sys.format_size(2), "2B")
+
+    def test_scan_files(self):
+        with TemporaryDirectory() as tmp_dir:
+            _make_tree(Path(tmp_dir))
+
+            def scan(**kwargs):
+                return sorted(Path(entry.path).relative_to(tmp_dir).as_posix()
+                              for entry in file_sys.scan_files(tmp_dir, **kwargs))
+
+            self.assertListEqual(sorted(str(file.relative_to(tmp_dir).as_posix())
+                                        for file in file_sys.walk_files(tmp_dir)), scan())
+            self.assertListEqual(["b.TXT"], scan(suffixes=[".txt"]))
+            self.assertListEqual(["a.csv", "b.TXT"], scan(patterns=["?.*"], max_depth=0))
+            self.assertListEqual(["a.csv", "sub/c.csv"], scan(suffixes=[".csv"], max_depth=1,
+                                                              exclude_dirs=[".*", "node_modules"]))
+            self.assertListEqual(scan(), scan(workers=4))
+
+    def test_delete_folder(self):
+        with TemporaryDirectory() as tmp_dir:
+            folder = Path(tmp_dir).joinpath("folder")
+            _make_tree(folder)
+            self.assertTrue(file_sys.delete_folder(folder, inclusive=False))
+            self.assertListEqual([], list(folder.iterdir()))
+            self.assertTrue(file_sys.delete_folder(folder))
+            self.assertFalse(folder.exists())
+
+
+class ZipFileTest(TestCase):
+    def test_zip_dir(self):
+        with TemporaryDirectory() as tmp_dir:
+            folder = Path(tmp_dir).joinpath("folder")
+            _make_tree(folder)
+            zip_path = Path(tmp_dir).joinpath("folder.zip")
+            zip_file.zip_dir(folder, zip_path, skip_suffixes=[".TXT"], exclude_dirs=["node_modules"])
+            with zipfile.ZipFile(zip_path) as zf:
+                self.assertListEqual([".git/e.csv", "a.csv", "empty/", "sub/c.csv", "sub/deep/d.csv"],
+                                     sorted(zf.namelist()))
+
+
+class CsvFileTest(TestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.folder = Path(self._tmp_dir.name)
+        self.rows = [[str(i), f"name{i}", "Needle\nin a cell" if (i % 7 == 0) else "hay"] for i in range(300)]
+        self.expected_rows = [row for row in self.rows if "needle" in row[2].lower()]
+        self.files = [_write_csv(self.folder.joinpath(f"file{n}.csv"), self.rows) for n in range(3)]
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_get_csv_rows_containing(self):
+        file, headers, rows = csv_file.get_csv_rows_containing(self.files[0], "needle", True, "utf-8")
+        self.assertEqual(self.files[0], file)
+        self.assertListEqual(HEADERS, headers)
+        self.assertListEqual(self.expected_rows, rows)
+
+        _, _, rows = csv_file.get_csv_rows_containing(self.files[0], "needle", False, "utf-8")
+        self.assertListEqual([], rows)
+
+    def test_get_csv_rows_containing_multiline_records(self):
+        rows = [["1", "plain", "say \"hi\""],
+                ["2", "first line\nsecond needle line", "x"],
+                ["3", "needle, \"quoted\"\nand more", "y"],
+                ["4", "no match\nneedl\ne", "z"]]
+        file = _write_csv(self.folder.joinpath("multiline.csv"), rows)
+
+        _, _, actual_rows = csv_file.get_csv_rows_containing(file, "needle", False, "utf-8")
+        self.assertListEqual(rows[1:3], actual_rows)
+
+        _, _, actual_rows = csv_file.get_csv_rows_containing(file, "\"hi", False, "utf-8")
+        self.assertListEqual(rows[:1], actual_rows)
+
+    def test_get_csv_rows_containing_stray_quote(self):
+        file = self.folder.joinpath("stray.csv")
+        file.write_bytes(b'id,name,note\r\n1,5" screen,hay\r\n2,tv,needle\r\n3,phone,hay\r\n'
+                         b'4,"multi\r\nline",needle two\r\n')
+
+        for use_mmap in (False, True):
+            _, _, rows = csv_file.get_csv_rows_containing(str(file), "needle", False, "utf-8", use_mmap=use_mmap)
+            self.assertListEqual([["2", "tv", "needle"], ["4", "multi\nline", "needle two"]], rows)
+
+    def test_get_csv_rows_containing_multiple_terms(self):
+        rows = [["1", "alice@example.com", "Sofia"],
+                ["2", "bob@example.com", "Plovdiv"],
+                ["3", "carol@example.com", "Varna"]]
+        file = _write_csv(self.folder.joinpath("terms.csv"), rows)
+
+        for use_mmap in (False, True):
+            _, headers, actual_rows = csv_file.get_csv_rows_containing(file, ["ALICE", "sofia", "varna", "dave"], True,
+                                                                       "utf-8", use_mmap=use_mmap)
+            self.assertListEqual(HEADERS + [csv_file.MATCHED_TERMS_HEADER], headers)
+            self.assertListEqual([rows[0] + ["alice, sofia"], rows[2] + ["varna"]], actual_rows)
+
+        _, headers, actual_rows = csv_file.get_csv_rows_containing(file, ["bob"], False, "utf-8")
+        self.assertListEqual(HEADERS, headers)
+        self.assertListEqual(rows[1:2], actual_rows)
+
+    def test_get_csv_rows_containing_regex(self):
+        _, _, rows = csv_file.get_csv_rows_containing(self.files[0], r"^needle\s", True, "utf-8", regex=True)
+        self.assertListEqual(self.expected_rows, rows)
+
+        _, headers, rows = csv_file.get_csv_rows_containing(self.files[0], [r"^name1\d$", "NEEDLE"], False, "utf-8",
+                                                            regex=True)
+        self.assertListEqual(HEADERS + [csv_file.MATCHED_TERMS_HEADER], headers)
+        self.assertListEqual([row + [r"^name1\d$"] for row in self.rows[10:20]], rows)
+
+    def test_get_csv_rows_containing_columns(self):
+        expected_rows = [row for row in self.rows if "1" in row[0]]
+        for use_mmap in (False, True):
+            _, _, rows = csv_file.get_csv_rows_containing(self.files[0], "1", False, "utf-8", use_mmap=use_mmap,
+                                                          columns=["id"])
+            self.assertListEqual(expected_rows, rows)
+
+        _, _, rows = csv_file.get_csv_rows_containing(self.files[0], "needle", True, "utf-8", columns=["name", "x"])
+        self.assertListEqual([], rows)
+
+        expected = [(file, HEADERS, expected_rows) for file in self.files]
+        for chunk_size in (500, None):
+            self.assertListEqual(expected, csv_file.get_csv_files_containing(self.files, "1", False, "utf-8",
+                                                                             chunk_size=chunk_size, columns=["id"]))
+
+    def test_get_csv_rows_containing_mmap(self):
+        expected = csv_file.get_csv_rows_containing(self.files[0], "needle", True, "utf-8")
+        self.assertTupleEqual(expected,
+                              csv_file.get_csv_rows_containing(self.files[0], "needle", True, "utf-8", use_mmap=True))
+        self.assertListEqual([(self.files[0], HEADERS, self.expected_rows)],
+                             csv_file.get_csv_files_containing(self.files[:1], "needle", True, "utf-8",
+                                                               chunk_size=500, use_mmap=True))
+
+    def test_get_csv_rows_containing_mmap_newline(self):
+        file = str(self.folder.joinpath("multiline.csv"))
+        Path(file).write_text('id,name\n1,"first\nneedle"\n2,second\n', encoding="utf-8", newline="")
+        self.assertFalse(csv_file._can_mmap(csv_file._Needle("first\nneedle", False), "utf-8", "excel"))
+
+        expected = ["id", "name"], [["1", "first\nneedle"]]
+        for use_mmap in (False, True):
+            _, headers, rows = csv_file.get_csv_rows_containing(file, "first\nneedle", False, "utf-8",
+                                                                use_mmap=use_mmap)
+            self.assertTupleEqual(expected, (headers, rows))
+
+    def test_get_csv_files_containing(self):
+        expected = [(file, HEADERS, self.expected_rows) for file in self.files]
+        self.assertListEqual(expected, csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8"))
+        self.assertListEqual(expected, csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8",
+                                                                         chunk_size=None))
+
+    def test_count_csv_files_containing(self):
+        expected = [(file, len(self.expected_rows)) for file in self.files]
+        for chunk_size in (500, None):
+            self.assertListEqual(expected, csv_file.count_csv_files_containing(self.files, "needle", True, "utf-8",
+                                                                               chunk_size=chunk_size))
+            counts = csv_file.count_csv_files_containing(self.files, "needle", True, "utf-8", chunk_size=chunk_size,
+                                                         limit=50)
+            self.assertEqual(50, sum(count for _, count in counts))
+
+    def test_get_csv_files_containing_limit(self):
+        for chunk_size, limit in ((500, 5), (None, 50), (None, 1000)):
+            results = csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8", chunk_size=chunk_size,
+                                                        limit=limit)
+            rows = [row for _, headers, rows in results for row in rows]
+            self.assertEqual(min(limit, 3 * len(self.expected_rows)), len(rows))
+            self.assertTrue(all(row in self.expected_rows for row in rows))
+
+    def test_get_csv_files_containing_lazy_files(self):
+        files = csv_file.iter_csv_files(self.folder)
+        actual = csv_file.get_csv_files_containing(files, "needle", True, "utf-8", chunk_size=500)
+        self.assertListEqual(sorted((file, HEADERS, self.expected_rows) for file in self.files), sorted(actual))
+
+    def test_get_csv_files_containing_in_chunks(self):
+        expected = [(file, HEADERS, self.expected_rows) for file in self.files]
+        for chunk_size in (64, 500, 1024):
+            actual = csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8", chunk_size=chunk_size)
+            self.assertListEqual(expected, actual)
+
+    def test_get_csv_files_containing_in_chunks_submitted_first(self):
+        collect_chunks_results = csv_file._collect_chunks_results
+        submitted_files = []
+
+        def collect(*args):
+            submitted_files.append(submit_chunks.call_count)
+            return collect_chunks_results(*args)
+
+        with patch.object(csv_file, "_submit_csv_chunks", wraps=csv_file._submit_csv_chunks) as submit_chunks, \
+                patch.object(csv_file, "_collect_chunks_results", side_effect=collect):
+            actual = csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8", chunk_size=500)
+
+        self.assertListEqual([(file, HEADERS, self.expected_rows) for file in self.files], actual)
+        self.assertListEqual([3, 3, 3], submitted_files)  # the chunks of all files, before any results
+
+    def test_get_csv_files_containing_in_chunks_stray_quote(self):
+        file = self.folder.joinpath("stray.csv")
+        file.write_bytes(b'id,name,note\r\n' + b'1,5" screen,hay\r\n2,"multi\r\nline 5",needle\r\n' * 3)
+        expected = [(str(file), ["id", "name", "note"], [["2", "multi\nline 5", "needle"]] * 3)]
+
+        for use_mmap in (False, True):
+            actual = csv_file.get_csv_files_containing([str(file)], "needle", False, "utf-8", chunk_size=16,
+                                                       regex=True, use_mmap=use_mmap)
+            self.assertListEqual(expected, actual)
+
+    def test_iter_csv_files_containing(self):
+        streamed = {}
+        for file, headers, rows in csv_file.iter_csv_files_containing(self.files, "needle", True, "utf-8",
+                                                                      max_rows_in_flight=5, batch_size=3):
+            self.assertListEqual(HEADERS, headers)
+            self.assertLessEqual(len(rows), 3)
+            streamed.setdefault(file, []).extend(rows)
+
+        self.assertSetEqual(set(self.files), set(streamed))
+        for rows in streamed.values():
+            self.assertListEqual(self.expected_rows, rows)
+
+    def test_iter_csv_files_containing_while_discovering(self):
+        discovered = []
+
+        def discover():
+            for file in self.files:
+                discovered.append(file)
+                yield file
+                time.sleep(1)  # slow discovery, the first file is searched meanwhile
+
+        batches = csv_file.iter_csv_files_containing(discover(), "needle", True, "utf-8", max_rows_in_flight=2)
+        _, _, rows = next(batches)
+        self.assertLess(len(discovered), len(self.files))
+        self.assertEqual(len(self.expected_rows) * len(self.files),
+                         len(rows) + sum(len(rows) for _, _, rows in batches))
+
+    def test_iter_csv_files_containing_early_stop(self):
+        batches = csv_file.iter_csv_files_containing(self.files, "needle", True, "utf-8", max_rows_in_flight=2)
+        _, _, rows = next(batches)
+        batches.close()
+        self.assertTrue(rows)
+
+
+class CompressedFileTest(TestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.folder = Path(self._tmp_dir.name)
+        self.rows = [[str(i), f"name{i}", "needle" if (i % 7 == 0) else "hay"] for i in range(100)]
+        self.expected_rows = [row for row in self.rows if row[2] == "needle"]
+        plain_file = _write_csv(self.folder.joinpath("plain.csv"), self.rows)
+        content = Path(plain_file).read_bytes()
+
+        self.folder.joinpath("gz.csv.gz").write_bytes(gzip.compress(content))
+        self.folder.joinpath("xz.csv.xz").write_bytes(lzma.compress(content))
+        with zipfile.ZipFile(self.folder.joinpath("archive.zip"), mode="w") as zf:
+            zf.writestr("dir/member.csv", content)
+            zf.writestr("readme.txt", "needle")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_split_zip_member(self):
+        archive = str(self.folder.joinpath("archive.zip"))
+        member = self.folder.joinpath("archive.zip", "dir", "member.csv")
+        self.assertTupleEqual((archive, "dir/member.csv"), compressed_file.split_zip_member(member))
+        self.assertIsNone(compressed_file.split_zip_member(archive))
+        self.assertIsNone(compressed_file.split_zip_member(self.folder.joinpath("plain.csv")))
+
+        with patch.object(Path, "exists", side_effect=AssertionError("no disk checks expected")):
+            self.assertIsNone(compressed_file.split_zip_member(self.folder.joinpath("plain.csv")))
+            self.assertTupleEqual((archive, "dir/member.csv"), compressed_file.split_zip_member(member))
+
+    def test_search(self):
+        files = sorted(csv_file.get_csv_files(self.folder))
+        expected_files = sorted(str(self.folder.joinpath(name))
+                                for name in ("plain.csv", "gz.csv.gz", "xz.csv.xz", "archive.zip/dir/member.csv"))
+        self.assertListEqual(expected_files, files)
+
+        for use_mmap in (False, True):
+            self.assertListEqual([(file, HEADERS, self.expected_rows) for file in files],
+                                 csv_file.get_csv_files_containing(files, "needle", False, "utf-8", chunk_size=64,
+                                                                   use_mmap=use_mmap))
+            for file in files + [str(self.folder.joinpath("archive.zip", "readme.txt"))]:
+                self.assertTrue(text_file.text_in_lines(file, "NEEDLE", True, use_mmap=use_mmap))
+
+
+class CsvResultCacheTest(TestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.folder = Path(self._tmp_dir.name)
+        self.files = [_write_csv(self.folder.joinpath(f"file{n}.csv"), [[str(n), "needle", "hay"]]) for n in range(3)]
+        self.cache = csv_cache.CsvResultCache(self.folder.joinpath("cache"))
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_get_csv_files_containing(self):
+        expected = csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8")
+        self.assertListEqual(expected, csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8",
+                                                                         cache=self.cache))
+
+        self.cache.put(self.files[1], "Needle", True, "utf-8", "excel", HEADERS, [["cached"]])
+        _write_csv(self.files[2], [["2", "changed needle", "hay"]])
+        actual = csv_file.get_csv_files_containing(self.files, "needle", True, "utf-8", cache=self.cache)
+        self.assertListEqual([expected[0],
+                              (self.files[1], HEADERS, [["cached"]]),
+                              (self.files[2], HEADERS, [["2", "changed needle", "hay"]])], actual)
+
+    def test_evict(self):
+        for file in self.files:
+            self.cache.put(file, "needle", False, "utf-8", "excel", HEADERS, [])
+        self.cache.get(self.files[0], "needle", False, "utf-8")
+
+        self.cache.max_size = max(entry.stat().st_size for entry in self.cache.folder.iterdir())
+        self.assertEqual(2, self.cache.evict())
+        self.assertIsNotNone(self.cache.get(self.files[0], "needle", False, "utf-8"))
+        self.assertIsNone(self.cache.get(self.files[1], "needle", False, "utf-8"))
+
+
+class CsvIndexTest(TestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.folder = Path(self._tmp_dir.name)
+        self.rows = [[str(i), f"name{i}", "Needle\nin a cell" if (i % 7 == 0) else "hay"] for i in range(300)]
+        self.files = [_write_csv(self.folder.joinpath(f"file{n}.csv"), self.rows) for n in range(3)]
+        self.index_file = self.folder.joinpath("index.sqlite")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_search(self):
+        with csv_index.CsvIndex(self.index_file) as index:
+            self.assertTupleEqual((3, 0), index.update(self.files))
+            self.assertTupleEqual((0, 0), index.update(self.files))
+            for text, ignorecase in (("needle", True), ("needle", False), ("e\ni", True), ("7", False),
+                                     (["NAME10", "name299"], True)):
+                expected = csv_file.get_csv_files_containing(self.files, text, ignorecase, "utf-8")
+                self.assertListEqual(expected, index.search(text, ignorecase))
+
+    def test_count(self):
+        with csv_index.CsvIndex(self.index_file) as index:
+            index.update(self.files)
+            for text, ignorecase in (("needle", True), ("7", False), (["NAME10", "name299"], True)):
+                expected = csv_file.count_csv_files_containing(self.files, text, ignorecase, "utf-8")
+                self.assertListEqual(expected, index.count(text, ignorecase))
+
+            self.assertListEqual([(self.files[0], 43), (self.files[1], 7)], index.count("needle", True, limit=50))
+
+    def test_update(self):
+        with csv_index.CsvIndex(self.index_file) as index:
+            index.update(self.files)
+            _write_csv(self.files[0], [["1", "changed", "needle"]])
+            self.assertTupleEqual((1, 2), index.update(self.files[:1]))
+            self.assertListEqual([(self.files[0], HEADERS, [["1", "changed", "needle"]])],
+                                 index.search("needle", False))
+
+    def test_update_undecodable_file(self):
+        broken = _write_csv(self.folder.joinpath("broken.csv"), [[str(i), "needle", "hay"] for i in range(10000)])
+        with open(broken, mode="ab") as fp:
+            fp.write(b"10000,\xff\xfe,hay\r\n")
+
+        with patch.object(csv_index, "_INSERT_BATCH_SIZE", 10), csv_index.CsvIndex(self.index_file) as index:
+            self.assertTupleEqual((1, 0), index.update([broken, self.files[0]]))
+            self.assertListEqual([(self.files[0], HEADERS, [row for row in self.rows if "needle" in row[2].lower()])],
+                                 index.search("needle", True))
+
+
+class CsvSniffTest(TestCase):
+    def setUp(self):
+        self._tmp_dir = TemporaryDirectory()
+        self.folder = Path(self._tmp_dir.name)
+        self.rows = [[str(i), "Иван Петров", "needle в купата" if (i % 5 == 0) else "сено"] for i in range(50)]
+        self.files = [_write_csv(self.folder.joinpath("utf8.csv"), self.rows),
+                      _write_csv(self.folder.joinpath("cp1251.csv"), self.rows, encoding="cp1251"),
+                      _write_csv(self.folder.joinpath("utf16.csv"), self.rows, encoding="utf-16")]
+        semicolon_file = self.folder.joinpath("semicolon.csv")
+        with open(semicolon_file, mode="w", encoding="utf-8-sig", newline="") as fp:
+            writer = csv.writer(fp, delimiter=";")
+            writer.writerow(HEADERS)
+            writer.writerows(self.rows)
+        self.files.append(str(semicolon_file))
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_sniff_csv_file(self):
+        encodings = [csv_sniff.sniff_csv_file(file)[0] for file in self.files]
+        self.assertListEqual(["utf-8", "windows-1251", "utf-16", "utf-8-sig"], encodings)
+        self.assertEqual(";", csv_sniff.sniff_csv_file(self.files[-1])[1].delimiter)
+
+    def test_get_csv_files_containing(self):
+        expected_rows = [row for row in self.rows if "needle" in row[2]]
+        expected = [(file, HEADERS, expected_rows) for file in self.files]
+        for chunk_size in (0, 256):
+            self.assertListEqual(expected, csv_file.get_csv_files_containing(self.files, "needle в", True, "auto",
+                                                                             chunk_size=chunk_size))
+        self.assertListEqual(expected, [(file, headers, list(rows))
+                                        for file, headers, rows
+                                        in csv_file.iter_csv_files_containing(self.files, "needle в", True, "auto")])
+
+    def test_get_csv_files_containing_sniff_cache(self):
+        for chunk_size in (0, 256):
+            cache = csv_sniff.CsvSniffCache(self.folder.joinpath(f"sniff{chunk_size}.json"))
+            csv_file.get_csv_files_containing(iter(self.files), "needle", True, "auto", chunk_size=chunk_size,
+                                              sniff_cache=cache)
+            reloaded = csv_sniff.CsvSniffCache(cache.file)
+            self.assertListEqual([repr(csv_sniff.sniff_csv_file(file)) for file in self.files],
+                                 [repr(reloaded.get(file)) for file in self.files])
+
+    def test_cache(self):
+        cache = csv_sniff.CsvSniffCache(self.folder.joinpath("sniff.json"))
+        for file in self.files:
+            encoding, dialect = csv_sniff.sniff_csv_file(file)
+            cache.put(file, "excel", encoding, dialect)
+        cache.save()
+        reloaded = csv_sniff.CsvSniffCache(cache.file)
+        self.assertListEqual([repr(csv_sniff.sniff_csv_file(file)) for file in self.files],
+                             [repr(reloaded.get(file)) for file in self.files])
+
+        _write_csv(self.files[0], self.rows, encoding="utf-16")
+        reloaded = csv_sniff.CsvSniffCache(cache.file)
+        self.assertIsNone(reloaded.get(self.files[0]))
+        csv_file.get_csv_files_containing(self.files, "needle", True, "auto", sniff_cache=reloaded)
+        self.assertEqual("utf-16", csv_sniff.CsvSniffCache(cache.file).get(self.files[0])[0])
+
+
+class MmapFileTest(TestCase):
+    def test_mmap_safe_encoding(self):
+        self.assertEqual("utf-8", mmap_file.mmap_safe_encoding("UTF8"))
+        self.assertEqual("utf-8", mmap_file.mmap_safe_encoding("utf-8-sig"))
+        self.assertEqual("cp1252", mmap_file.mmap_safe_encoding("cp1252"))
+        self.assertEqual("iso8859-1", mmap_file.mmap_safe_encoding("latin-1"))
+        self.assertIsNone(mmap_file.mmap_safe_encoding("utf-16"))
+        self.assertIsNone(mmap_file.mmap_safe_encoding("shift_jis"))
+        self.assertIsNone(mmap_file.mmap_safe_encoding("no-such-encoding"))
+
+
+class TextFileTest(TestCase):
+    def test_text_in_lines(self):
+        with TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir).joinpath("text.txt")
+            file.write_text("first line\nÜber SECOND line\n", encoding="utf-8")
+            empty_file = Path(tmp_dir).joinpath("empty.txt")
+            empty_file.write_text("")
+
+            for use_mmap in (False, True):
+                self.assertTrue(text_file.text_in_lines(file, "second", True, use_mmap=use_mmap))
+                self.assertFalse(text_file.text_in_lines(file, "second", False, use_mmap=use_mmap))
+                self.assertTrue(text_file.text_in_lines(file, "Über", False, use_mmap=use_mmap))
+                self.assertTrue(text_file.text_in_lines(file, "über", True, use_mmap=use_mmap))
+                self.assertFalse(text_file.text_in_lines(file, "line\nÜber", False, use_mmap=use_mmap))
+                self.assertFalse(text_file.text_in_lines(empty_file, "x", True, use_mmap=use_mmap))
+
+    def test_iter_files_containing_text_in_lines(self):
+        with TemporaryDirectory() as tmp_dir:
+            files = []
+            for n in range(200):
+                file = Path(tmp_dir).joinpath(f"file{n}.txt")
+                file.write_text("line\nneedle line\n" if (n % 3 == 0) else "line\nhay\n")
+                files.append(str(file))
+            expected = files[::3]
+
+            self.assertListEqual(expected, list(text_file.iter_files_containing_text_in_lines(
+                files, "NEEDLE", True, "utf-8")))
+            self.assertSetEqual(set(expected), set(text_file.iter_files_containing_text_in_lines(
+                iter(files), "needle", False, "utf-8", ordered=False)))
+            self.assertListEqual(expected[:5], list(text_file.iter_files_containing_text_in_lines(
+                files, "needle", False, "utf-8", max_results=5)))
+            self.assertIs(text_file._get_pool(), text_file._get_pool())
+
+            pool = text_file._get_pool()
+            for process in list(pool._processes.values()):
+                process.kill()
+                process.join()
+            self.assertRaises(BrokenProcessPool, lambda: pool.submit(int).result())  # the pool noticed the kill
+            self.assertListEqual(expected, list(text_file.iter_files_containing_text_in_lines(
+                files, "needle", False, "utf-8")))
+            self.assertIsNot(pool, text_file._get_pool())
+
+    def test_iter_text_hits_in_lines(self):
+        with TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir).joinpath("text.txt")
+            file.write_bytes("Über\r\nneedle 1\nx\nNEEDLE 2\ny\nz".encode("utf-8"))
+            file = str(file)
+
+            hits = list(text_file.iter_text_hits_in_lines(file, "needle", True))
+            self.assertListEqual([text_file.TextHit(file, 2, 7, "needle 1", (), ()),
+                                  text_file.TextHit(file, 4, 18, "NEEDLE 2", (), ())], hits)
+
+            hits = list(text_file.iter_text_hits_in_lines(file, "needle", True, before=1, after=2))
+            self.assertTupleEqual(("Über",), hits[0].before)
+            self.assertTupleEqual(("x", "NEEDLE 2"), hits[0].after)
+            self.assertTupleEqual(("x",), hits[1].before)
+            self.assertTupleEqual(("y", "z"), hits[1].after)
+
+            self.assertListEqual(hits, list(text_file.iter_lines_containing_text([file, file], "needle", True, "utf-8",
+                                                                                 before=1, after=2, max_results=2)))
+
+
+class XlsxFileTest(TestCase):
+    def test_xlsx_stream_writer(self):
+        with TemporaryDirectory() as tmp_dir:
+            with xlsx_file.XlsxStreamWriter(str(Path(tmp_dir).joinpath("report"))) as writer:
+                writer.append("first", HEADERS, [[1, "a", "b"]])
+                writer.append("second", HEADERS, [[2, "c", "d"]])
+                writer.append("first", HEADERS, [[3, "e", "f"]])
+
+            self.assertTrue(writer.file.endswith("report.xlsx"))
+            workbook = load_workbook(writer.file)
+            self.assertListEqual(["first", "second"], workbook.sheetnames)
+            self.assertListEqual([tuple(HEADERS), (1, "a", "b"), (3, "e", "f")],
+                                 list(workbook["first"].values))
+
+    def test_xlsx_stream_sheets_data(self):
+        rows = ([i, "x" * (i % 7), "y"] for i in range(30))
+        with TemporaryDirectory() as tmp_dir:
+            file = xlsx_file.xlsx_stream_sheets_data(str(Path(tmp_dir).joinpath("report.xlsx")),
+                                                     [("data", HEADERS, rows)])
+
+            sheet = load_workbook(file)["data"]
+            self.assertEqual(31, sheet.max_row)
+            self.assertEqual("A2", sheet.freeze_panes)
+            self.assertEqual("A1:C31", sheet.auto_filter.ref)
+            self.assertTrue(sheet["A1"].font.b)
+            self.assertEqual(7, sheet.column_dimensions["B"].width)  # longest value (6 chars) + 1
+
+    def test_xlsx_workbook_columns_widths(self):
+        rows = [[i, "x" * (i % 7), None] for i in range(30)]
+        sheet = xlsx_file.xlsx_workbook_from_sheets_data([("data", HEADERS, rows)])["data"]
+        self.assertEqual(7, sheet.column_dimensions["B"].width)  # longest value (6 chars) + 1
+        self.assertEqual(5, sheet.column_dimensions["C"].width)  # header 'note' + 1
+
+        sheet = xlsx_file._append_sheet_data(Workbook(), "sampled", HEADERS, rows, width_sample_rows=2)
+        self.assertEqual(31, sheet.max_row)
+        self.assertLessEqual(sheet.column_dimensions["B"].width, 7)
+
+    def test_sheet_overflow(self):
+        rows = [[i, "a", "b"] for i in range(5)]
+        workbook = xlsx_file.xlsx_workbook_from_sheets_data([("data", HEADERS, rows)], max_sheet_rows=3)
+        self.assertListEqual(["data", "data (2)", "data (3)"], workbook.sheetnames)
+        self.assertListEqual([tuple(HEADERS), (4, "a", "b")], list(workbook["data (3)"].values))
+
+        with TemporaryDirectory() as tmp_dir:
+            with xlsx_file.XlsxStreamWriter(str(Path(tmp_dir).joinpath("report")), max_sheet_rows=3) as writer:
+                writer.append("data", HEADERS, rows[:3])
+                writer.append("data", HEADERS, rows[3:])
+
+            self.assertListEqual([("data", 2), ("data (2)", 2), ("data (3)", 1)], writer.get_sheets_rows())
+            workbook = load_workbook(writer.file)
+            self.assertListEqual([tuple(HEADERS), (2, "a", "b"), (3, "a", "b")], list(workbook["data (2)"].values))
+            self.assertEqual("A1:C3", workbook["data (2)"].auto_filter.ref)
+
+    def test_xlsx_write_workbooks(self):
+        sheets_data = [("first", HEADERS, [[i, "a", "b"] for i in range(5)]),
+                       ("second", HEADERS, iter([[i, "c", "d"] for i in range(2)]))]
+        with TemporaryDirectory() as tmp_dir:
+            manifest_file = xlsx_file.xlsx_write_workbooks(str(Path(tmp_dir).joinpath("report.xlsx")), sheets_data,
+                                                           max_workbook_rows=4, workers=2)
+
+            self.assertEqual(str(Path(tmp_dir).joinpath("report.manifest.json")), manifest_file)
+            with open(manifest_file, encoding="utf-8") as fp:
+                manifest = json.load(fp)
+            self.assertListEqual([{"file": "report_001.xlsx", "sheets": [{"title": "first", "rows": 4}]},
+                                  {"file": "report_002.xlsx", "sheets": [{"title": "first (2)", "rows": 1},
+                                                                         {"title": "second", "rows": 2}]}],
+                                 manifest["workbooks"])
+            workbook = load_workbook(Path(tmp_dir).joinpath("report_002.xlsx"))
+            self.assertListEqual([tuple(HEADERS), (0, "c", "d"), (1, "c", "d")], list(workbook["second"].values))
+
+    def test_xlsx_write_workbooks_in_batches(self):
+        sheets_data = [("first", HEADERS, iter([[i, "a", "b"] for i in range(7)])), ("empty", HEADERS, []),
+                       ("second", HEADERS, iter([[i, "c", "d"] for i in range(3)]))]
+        with TemporaryDirectory() as tmp_dir, patch.object(xlsx_file, "_WORKBOOK_BATCH_ROWS", 2):
+            manifest_file = xlsx_file.xlsx_write_workbooks(str(Path(tmp_dir).joinpath("report")), sheets_data,
+                                                           max_workbook_rows=4, workers=2)
+
+            with open(manifest_file, encoding="utf-8") as fp:
+                manifest = json.load(fp)
+            self.assertListEqual([{"file": "report_001.xlsx", "sheets": [{"title": "first", "rows": 4}]},
+                                  {"file": "report_002.xlsx", "sheets": [{"title": "first (2)", "rows": 3},
+                                                                         {"title": "empty", "rows": 0},
+                                                                         {"title": "second", "rows": 1}]},
+                                  {"file": "report_003.xlsx", "sheets": [{"title": "second (2)", "rows": 2}]}],
+                                 manifest["workbooks"])
+            workbook = load_workbook(Path(tmp_dir).joinpath("report_002.xlsx"))
+            self.assertListEqual([tuple(HEADERS), (4, "a", "b"), (5, "a", "b"), (6, "a", "b")],
+                                 list(workbook["first (2)"].values))
+
+    def test_xlsx_read_sheets_data(self):
+        sheets_data = [("first", HEADERS, [[1, "a", "b"], [2.5, None, "c"], [3, "d"], [True, "e", "f"]]),
+                       ("second", ["id"], [])]
+        with TemporaryDirectory() as tmp_dir:
+            files = [xlsx_file.xlsx_write_sheets_data(str(Path(tmp_dir).joinpath("report")), sheets_data,
+                                                      max_sheet_rows=3),
+                     xlsx_file.xlsx_stream_sheets_data(str(Path(tmp_dir).joinpath("stream")), sheets_data,
+                                                       max_sheet_rows=3)]
+            for file in files:
+                for engine in ("openpyxl", "lxml"):
+                    actual = [(title, headers, list(rows))
+                              for title, headers, rows in xlsx_file.xlsx_read_sheets_data(file, engine=engine)]
+                    self.assertListEqual(sheets_data, actual, msg=f"file: {file}, engine: {engine}")
+
+                    sheets = xlsx_file.xlsx_read_sheets_data(file, engine=engine, merge_continued=False)
+                    titles = [title for title, _, _ in sheets]
+                    self.assertListEqual(["first", "first (2)", "second"], titles)
+
+    def test_xlsx_read_sheets_data_empty_strings(self):
+        sheets_data = [("first", HEADERS, [["1", "", "x"], ["2", "y", ""], ["", "", ""], ["3", None, "z"]])]
+        with TemporaryDirectory() as tmp_dir:
+            files = [xlsx_file.xlsx_write_sheets_data(str(Path(tmp_dir).joinpath("report")), sheets_data),
+                     xlsx_file.xlsx_stream_sheets_data(str(Path(tmp_dir).joinpath("stream")), sheets_data)]
+            for file in files:
+                for engine in ("openpyxl", "lxml"):
+                    actual = [(title, headers, list(rows))
+                              for title, headers, rows in xlsx_file.xlsx_read_sheets_data(file, engine=engine)]
+                    self.assertListEqual(sheets_data, actual, msg=f"file: {file}, engine: {engine}")
+
+    def test_xlsx_read_sheets_data_unrelated_sheet(self):
+        sheets_data = [("Report", HEADERS, [[1, "a", "b"]]), ("Report (2)", ["total"], [[10]])]
+        with TemporaryDirectory() as tmp_dir:
+            file = xlsx_file.xlsx_write_sheets_data(str(Path(tmp_dir).joinpath("report")), sheets_data)
+            for engine in ("openpyxl", "lxml"):
+                actual = [(title, headers, list(rows))
+                          for title, headers, rows in xlsx_file.xlsx_read_sheets_data(file, engine=engine)]
+                self.assertListEqual(sheets_data, actual, msg=f"engine: {engine}")
+
+
+class ReportFileTest(TestCase):
+    SHEETS_DATA = [("first", HEADERS, [["1", "a", "b"], ["2", "c", "d"]]),
+                   ("other", ["id", "value"], iter([["3", "e"]])),
+                   ("second", HEADERS, [["4", "f", "g"]])]
+
+    def test_csv_report(self):
+        with TemporaryDirectory() as tmp_dir:
+            with report_file.get_report_writer(str(Path(tmp_dir).joinpath("report.csv"))) as writer:
+                for title, headers, rows in self.SHEETS_DATA:
+                    writer.append(title, headers, rows)
+
+            self.assertListEqual([str(Path(tmp_dir).joinpath(name)) for name in ("report.csv", "report_2.csv")],
+                                 writer.get_files())
+            with open(writer.file, encoding="utf-8", newline="") as fp:
+                self.assertListEqual([["sheet"] + HEADERS, ["first", "1", "a", "b"], ["first", "2", "c", "d"],
+                                      ["second", "4", "f", "g"]], list(csv.reader(fp)))
+            with open(writer.get_files()[1], encoding="utf-8", newline="") as fp:
+                self.assertListEqual([["sheet", "id", "value"], ["other", "3", "e"]], list(csv.reader(fp)))
+
+    def test_jsonl_report(self):
+        with TemporaryDirectory() as tmp_dir:
+            file = report_file.write_report(str(Path(tmp_dir).joinpath("report.jsonl")), self.SHEETS_DATA[:1],
+                                            title_column=None)
+
+            with open(file, encoding="utf-8") as fp:
+                self.assertListEqual([{"id": "1", "name": "a", "note": "b"}, {"id": "2", "name": "c", "note": "d"}],
+                                     [json.loads(line) for line in fp])
+
+    def test_jsonl_report_keys(self):
+        with TemporaryDirectory() as tmp_dir:
+            file = report_file.write_report(str(Path(tmp_dir).joinpath("report.jsonl")),
+                                            [("first", ["file", "id", "id"], [["a", "1", "2"], ["b", "3", "4", "x"]])],
+                                            title_column="file")
+
+            with open(file, encoding="utf-8") as fp:
+                self.assertListEqual([{"file": "first", "file_2": "a", "id": "1", "id_2": "2"},
+                                      {"file": "first", "file_2": "b", "id": "3", "id_2": "4", "column_5": "x"}],
+                                     [json.loads(line) for line in fp])
+
+    def test_report_suffix(self):
+        with TemporaryDirectory() as tmp_dir:
+            for name in ("REPORT.CSV", "REPORT.JSONL", "REPORT.XLSX"):
+                file = report_file.write_report(str(Path(tmp_dir).joinpath(name)), self.SHEETS_DATA[:1])
+                self.assertEqual(str(Path(tmp_dir).joinpath(name)), file)
+
+    def test_xlsx_report_title_column(self):
+        with TemporaryDirectory() as tmp_dir:
+            file = report_file.write_report(str(Path(tmp_dir).joinpath("report.xlsx")), self.SHEETS_DATA[:1],
+                                            title_column="sheet")
+
+            self.assertListEqual([("first", ["sheet"] + HEADERS, [["first", "1", "a", "b"], ["first", "2", "c", "d"]])],
+                                 [(title, headers, list(rows))
+                                  for title, headers, rows in xlsx_file.xlsx_read_sheets_data(file)])
+
+    def test_unsupported_report(self):
+        self.assertRaises(ValueError, report_file.get_report_writer, "report.txt")
+
+    @skipIf(importlib.util.find_spec("pyarrow") is None, reason="pyarrow not installed")
+    def test_arrow_reports(self):
+        import pandas
+
+        with TemporaryDirectory() as tmp_dir:
+            for suffix, read in ((".parquet", pandas.read_parquet), (".feather", pandas.read_feather)):
+                file = report_file.write_report(str(Path(tmp_dir).joinpath("report" + suffix)),
+                                                [("first", HEADERS, [["1", "a"], [2, "c", "d", "x"]])])
+
+                frame = read(file)
+                self.assertListEqual(["sheet"] + HEADERS, list(frame.columns))
+                self.assertListEqual([["first", "1", "a", ""], ["first", "2", "c", "d"]],
+                                     frame.fillna("").values.tolist())
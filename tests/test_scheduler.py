@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from hed_utils.support.scheduler import LptScheduler
+
+
+class TestLptScheduler(TestCase):
+
+    def test_submit_largest_first(self):
+        started = []
+        release = threading.Event()
+
+        def task(name):
+            started.append(name)
+            if name == "blocker":
+                release.wait(5)
+            return name.upper()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            scheduler = LptScheduler(pool, max_in_flight=1)
+            futures = [scheduler.submit(0, task, "blocker")]
+            futures.extend(scheduler.submit(size, task, name)
+                           for size, name in ((1, "small"), (10, "big"), (5, "medium")))
+            release.set()
+            results = [future.result(5) for future in futures]
+
+        self.assertListEqual(["blocker", "big", "medium", "small"], started)
+        self.assertListEqual(["BLOCKER", "SMALL", "BIG", "MEDIUM"], results)
+
+        usage = scheduler.get_usage()
+        self.assertEqual(1, len(usage))
+        self.assertEqual(4, usage[0].tasks)
+
+    def test_submit_raises(self):
+        def fail():
+            raise ValueError("failed")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            scheduler = LptScheduler(pool, max_in_flight=2)
+            future = scheduler.submit(1, fail)
+            with self.assertRaises(ValueError):
+                future.result(5)
+            self.assertEqual(3, scheduler.submit(1, len, "abc").result(5))
@@ -1,4 +1,5 @@
 import sys
+from datetime import datetime
 from unittest import TestCase
 from unittest import skipIf
 from hed_utils.support import text_tool
@@ -17,6 +18,23 @@ class TestTextTool(TestCase):
         self.assertListEqual(text_tool.get_indices(text, "23"), [1, 7])
         self.assertListEqual(text_tool.get_indices(text, "bb"), [12])
 
+    def test_iter_indices(self):
+        self.assertListEqual([0, 2], list(text_tool.iter_indices("aaaaa", "aa")))
+        self.assertListEqual([], list(text_tool.iter_indices("aaaaa", "b")))
+        with self.assertRaises(ValueError):
+            list(text_tool.iter_indices("aaaaa", ""))
+
+    def test_compile_terms_pattern(self):
+        terms = ["foo", "foobar", "fox", "a.b", "x"]
+        pattern = text_tool.compile_terms_pattern(terms)
+        self.assertEqual(r"(?:a\.b|fo(?:o(?:bar)?|x)|x)", pattern.pattern)
+        self.assertListEqual(["foobar", "x", "a.b", "fox"], pattern.findall("foobar-x-a.b-a_b-fox"))
+        self.assertIsNone(pattern.search("fo-ab-o"))
+
+        bytes_pattern = text_tool.compile_terms_pattern([term.encode() for term in terms])
+        self.assertListEqual([b"foo", b"fox"], bytes_pattern.findall(b"foo-FOX-fox"))
+        self.assertIsNone(text_tool.compile_terms_pattern([]).search("anything"))
+
     def test_invert_quotes(self):
         text = "asd'asds\"__23123___ A\"'''"
         inverted_text = "asd\"asds'__23123___ A'\"\"\""
@@ -65,6 +83,15 @@ class TestTextTool(TestCase):
         text = "asd 123 qasd2 2qwa 23 41 a 2019-02-34 sasd 2020-01-23"
         expected_dates = ["2020-01-23"]
         self.assertListEqual(expected_dates, text_tool.find_dates(text))
+        self.assertListEqual(["2020-01-23", "2020-01-24"], text_tool.find_dates("2020-01-23 2020-01-24 12020-01-25"))
+        self.assertListEqual(["23 Jan 2020 10:11"], text_tool.find_dates("on 23 Jan 2020 10:11.", "%d %b %Y %H:%M"))
+        with self.assertRaises(ValueError):
+            text_tool.find_dates(text, "%Q")
+
+    def test_find_dates_many(self):
+        docs = ["no dates", "01/02/2021 and 30/02/2021", "31.12.2020, 31/12/2020"]
+        expected = [(1, "01/02/2021", datetime(2021, 2, 1)), (2, "31/12/2020", datetime(2020, 12, 31))]
+        self.assertListEqual(expected, list(text_tool.find_dates_many(docs, "%d/%m/%Y")))
 
     @skipIf(sys.platform == "linux", "OS encoding issue")
     def test_normalize(self):
@@ -72,3 +99,11 @@ class TestTextTool(TestCase):
         expected_normalized_items = ['Une conservation telephonique', "Les vacances d'ete"]
         actual_normalized_items = [text_tool.normalize(i) for i in raw_items]
         self.assertListEqual(expected_normalized_items, actual_normalized_items)
+
+    def test_normalize_many(self):
+        raw_items = ["Une conservation t\u00e9l\u00e9phonique", "\u0665\t\u0969\r\n"]
+        expected_normalized_items = ["Une conservation telephonique", "5 3\n"]
+        self.assertListEqual(expected_normalized_items, list(text_tool.normalize_many(raw_items)))
+        self.assertListEqual([text_tool.normalize(i) for i in raw_items], list(text_tool.normalize_many(raw_items)))
+        self.assertListEqual(["\u0665\t\u0969\r\n"],
+                             list(text_tool.normalize_many(raw_items[1:], map_digits=False, map_whitespace=False)))